@@ -13,11 +13,12 @@
 # limitations under the License.
 
 import base64
+import functools
 import json
 import logging
 import os
 import sys
-from typing import Optional, Sequence
+from typing import Optional, Sequence, Type
 
 import proto
 from google.api_core.client_info import ClientInfo
@@ -279,29 +280,33 @@ def extract_bucket_and_blob_name(row):
     return parts[0], "/".join(parts[1:]), parts[-1]
 
 
+@functools.cache
+def get_proto_schema(message_type: Type[proto.Message]) -> types.ProtoSchema:
+    """Get the (cached) writer schema for a message type"""
+    proto_descriptor = descriptor_pb2.DescriptorProto()  # pylint: disable=no-member
+    message_type.pb().DESCRIPTOR.CopyToProto(proto_descriptor)
+    return types.ProtoSchema(proto_descriptor=proto_descriptor)
+
+
 def get_proto_data(obj: Sequence[proto.Message], with_schema: bool = True):
     """Convert a sequence of messages into proto data"""
 
-    proto_data = types.AppendRowsRequest.ProtoData()
+    message_type = type(obj[0])
+
+    # Serialize the rows, without the proto-plus marshalling per row
+    proto_data = types.AppendRowsRequest.ProtoData.pb()(
+        rows=types.ProtoRows.pb()(
+            serialized_rows=[message_type.pb(o).SerializeToString() for o in obj]
+        )
+    )
 
     # Bring in the schema if requested (required first time)
     if with_schema:
-        proto_schema = types.ProtoSchema()
-        proto_descriptor = descriptor_pb2.DescriptorProto()  # pylint: disable=no-member
-        type(obj[0]).pb().DESCRIPTOR.CopyToProto(proto_descriptor)
-        proto_schema.proto_descriptor = proto_descriptor
-        proto_data.writer_schema = proto_schema
-
-    # Serialize the rows
-    proto_rows = types.ProtoRows()
-    for o in obj:
-        proto_rows.serialized_rows.append(
-            type(o).serialize(o)
-        )  # pylint: disable=no-member
-
-    proto_data.rows = proto_rows
-
-    return proto_data
+        proto_data.writer_schema.CopyFrom(
+            types.ProtoSchema.pb(get_proto_schema(message_type))
+        )
+
+    return types.AppendRowsRequest.ProtoData.wrap(proto_data)
 
 
 if __name__ == "__main__":
@@ -259,8 +259,17 @@ def generate_process_job_params(**context):
     supported_files = {
         x["file-suffix"]: x["processor"] for x in context["params"]["supported_files"]
     }
+    files_to_process = context["ti"].xcom_pull(
+        key="return_value",
+        task_ids="initial_load_from_input_bucket.move_duplicated_files_to_rejected_bucket",
+    )
     process_job_params = cloud_run_utils.get_process_job_params(
-        bq_table, doc_processor_job_name, gcs_reject_bucket, mv_params, supported_files
+        bq_table,
+        doc_processor_job_name,
+        gcs_reject_bucket,
+        mv_params,
+        supported_files,
+        files_by_type=files_to_process,
     )
     return process_job_params
 
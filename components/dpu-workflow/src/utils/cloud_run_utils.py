@@ -12,8 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
 from enum import Enum
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
+
+# Files processed by each task of the document processor job, and the
+# maximum number of tasks a folder is split across
+PROCESS_FILES_PER_TASK = 500
+PROCESS_MAX_TASK_COUNT = 100
 
 
 class FolderNames(str, Enum):
@@ -28,6 +34,9 @@ def get_process_job_params(
     mv_params,
     supported_files: Dict[str, str],
     timeout: int = 600,
+    files_by_type: Optional[Dict[str, List[str]]] = None,
+    files_per_task: int = PROCESS_FILES_PER_TASK,
+    max_task_count: int = PROCESS_MAX_TASK_COUNT,
 ):
     process_job_params = []
     supported_files_args = [f"--file-type={k}:{v}" for k, v in supported_files.items()]
@@ -39,11 +48,20 @@ def get_process_job_params(
             f"{bq_table['project_id']}.{bq_table['dataset_id']}."
             f"{bq_table['table_id']}"
         )
+        # Checkpoint alongside the other job I/O, so a retried task resumes
+        process_folder, _, typ = (
+            mv_obj["destination_object"].rstrip("/").rpartition("/")
+        )
+        checkpoint_dir = (
+            f"gs://{mv_obj['destination_bucket']}/"
+            f"{process_folder}/workflow-io/checkpoints/{typ}"
+        )
         args = [
             dest,
             reject_dest,
             "--write_json=False",
             f"--write_bigquery={bq_id}",
+            f"--checkpoint_dir={checkpoint_dir}",
         ]
         args.extend(supported_files_args)
         job_param = {
@@ -55,7 +73,11 @@ def get_process_job_params(
                         "clear_args": False,
                     }
                 ],
-                "task_count": 1,
+                "task_count": get_task_count(
+                    len((files_by_type or {}).get(typ, [])),
+                    files_per_task,
+                    max_task_count,
+                ),
                 "timeout": f"{timeout}s",
             }
         }
@@ -63,6 +85,11 @@ def get_process_job_params(
     return process_job_params
 
 
+def get_task_count(file_count: int, files_per_task: int, max_task_count: int):
+    """Get the number of tasks (shards) to process a number of files"""
+    return max(1, min(max_task_count, math.ceil(file_count / files_per_task)))
+
+
 def __build_gcs_path__(bucket: str, folder: str, folder_name: FolderNames):
     return f"gs://{bucket}/{folder}/{folder_name.value}"
 
@@ -0,0 +1,67 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Microbenchmark of constructing GCSPath objects
+
+Measures constructing paths (as when listing), then using them, and the memory
+they hold, e.g.
+
+    python benchmarks/bench_gcspath.py --paths 1000000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from processors.base.gcsio import GCSPath
+from processors.base.memory_storage import MemoryClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--paths", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    # No requests are made, but binding a bucket needs a client
+    GCSPath.use_client(MemoryClient())
+
+    for prefix in ["gs://bucket/process", "/tmp/process"]:
+        names = [
+            f"{prefix}/folder-{i % 100}/document-{i}.msg" for i in range(args.paths)
+        ]
+
+        start = time.perf_counter()
+        paths = [GCSPath(name) for name in names]
+        constructed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for path in paths:
+            _ = path.suffix, str(path)
+        used = time.perf_counter() - start
+
+        del paths
+        tracemalloc.start()
+        paths = [GCSPath(name) for name in names]
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{args.paths:>9} {prefix:>20}: "
+            f"construct {args.paths / constructed:>12,.0f} paths/sec, "
+            f"first use {args.paths / used:>12,.0f} paths/sec, "
+            f"{memory / len(paths):>6.0f} bytes/path"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Microbenchmark of encoding DocumentMetadata rows for the Storage Write API
+
+Compares the per-row proto-plus encoding with the ProtoRowEncoder, e.g.
+
+    python benchmarks/bench_proto_encoder.py --rows 10000 1000000
+"""
+
+import argparse
+import json
+import time
+
+from google.cloud.bigquery_storage_v1 import types  # type: ignore[import-untyped]
+from google.protobuf import descriptor_pb2
+from processors.base.proto_encoder import get_encoder
+from processors.base.result_writer import DocumentMetadata
+
+
+def per_row_proto_data(obj):
+    """Encoding with the schema rebuilt and rows appended one by one"""
+    proto_data = types.AppendRowsRequest.ProtoData()
+    proto_schema = types.ProtoSchema()
+    proto_descriptor = descriptor_pb2.DescriptorProto()  # pylint: disable=no-member
+    type(obj[0]).pb().DESCRIPTOR.CopyToProto(proto_descriptor)
+    proto_schema.proto_descriptor = proto_descriptor
+    proto_data.writer_schema = proto_schema
+
+    proto_rows = types.ProtoRows()
+    for o in obj:
+        proto_rows.serialized_rows.append(type(o).serialize(o))
+    proto_data.rows = proto_rows
+    return proto_data
+
+
+def encoder_proto_data(obj):
+    """Encoding with the cached schema and batch serialized rows"""
+    encoder = get_encoder(type(obj[0]))
+    return encoder.get_proto_data(encoder.serialize_rows(obj))
+
+
+def make_rows(count: int):
+    return [
+        DocumentMetadata(
+            id=f"id-{i}",
+            jsonData=json.dumps({"objs": [], "metadata": {}, "status": "Indexed"}),
+            content=DocumentMetadata.Content(
+                mimeType="text/plain",
+                uri=f"gs://bucket/process/txt/document-{i}.txt",
+            ),
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000])
+    args = parser.parse_args()
+
+    for count in args.rows:
+        rows = make_rows(count)
+        for name, fn in [
+            ("per-row", per_row_proto_data),
+            ("encoder", encoder_proto_data),
+        ]:
+            start = time.perf_counter()
+            fn(rows)
+            elapsed = time.perf_counter() - start
+            print(f"{count:>9} rows {name:>8}: {count / elapsed:>12,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Checksums of local files, computed in a single pass and cached
+
+    Digests are encoded as URL-safe base64 strings, as used for GCSPath.crc32c
+    of local files.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import IO, Dict, Iterable, Optional, Tuple
+
+import google_crc32c
+
+logger = logging.getLogger(__name__)
+
+# Size of the reads when computing checksums (the crc32c extension only
+# accepts bytes, so files are read rather than mapped)
+CHECKSUM_BUFFER_SIZE = int(os.environ.get("CHECKSUM_BUFFER_SIZE", str(1024 * 1024)))
+
+# Maximum number of files with cached checksums
+CHECKSUM_CACHE_SIZE = int(os.environ.get("CHECKSUM_CACHE_SIZE", "10000"))
+
+CRC32C = "crc32c"
+MD5 = "md5"
+SHA256 = "sha256"
+ALGORITHMS = (CRC32C, MD5, SHA256)
+
+if google_crc32c.implementation != "c":
+    logger.warning("google-crc32c is not using the C extension, crc32c is slow")
+
+
+def encode_digest(digest: bytes) -> str:
+    """Encode a digest as a string"""
+    return str(base64.urlsafe_b64encode(digest), "utf8")
+
+
+class Hasher:
+    """Hasher - computes several digests of the same data in one pass"""
+
+    def __init__(self, algorithms: Iterable[str] = (CRC32C,)):
+        self.hashes = {}
+        for algorithm in algorithms:
+            if algorithm == CRC32C:
+                self.hashes[algorithm] = google_crc32c.Checksum()
+            elif algorithm in ALGORITHMS:
+                self.hashes[algorithm] = hashlib.new(algorithm)
+            else:
+                raise ValueError(f"Unsupported checksum algorithm {algorithm}")
+
+    def update(self, data: bytes):
+        """Add data to all the digests"""
+        for h in self.hashes.values():
+            h.update(data)
+
+    def digests(self) -> Dict[str, str]:
+        """Get the encoded digests, by algorithm"""
+        return {
+            algorithm: encode_digest(h.digest()) for algorithm, h in self.hashes.items()
+        }
+
+
+class HashingReader:
+    """HashingReader - wraps a binary stream, hashing the data as it is read"""
+
+    def __init__(self, stream: IO[bytes], hasher: Hasher):
+        self.stream = stream
+        self.hasher = hasher
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.hasher.update(data)
+        return data
+
+    def __getattr__(self, attr):
+        return getattr(self.stream, attr)
+
+
+class HashingWriter:
+    """HashingWriter - wraps a binary stream, hashing the data as it is written"""
+
+    def __init__(self, stream: IO[bytes], hasher: Hasher):
+        self.stream = stream
+        self.hasher = hasher
+
+    def write(self, data: bytes) -> int:
+        self.hasher.update(bytes(data))
+        return self.stream.write(data)
+
+    def __getattr__(self, attr):
+        return getattr(self.stream, attr)
+
+
+FileKey = Tuple[str, int, int]
+
+
+class ChecksumCache:
+    """ChecksumCache - digests of local files, keyed by path, mtime and size
+
+    A file is hashed again if it has been modified (or replaced) since.
+    """
+
+    def __init__(self, max_size: int = CHECKSUM_CACHE_SIZE):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[FileKey, Dict[str, str]]" = OrderedDict()
+
+    @staticmethod
+    def key(filename: str) -> FileKey:
+        """Get the key of the current version of a file"""
+        stat = os.stat(filename)
+        return (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, key: FileKey) -> Dict[str, str]:
+        """Get the cached digests of a file version"""
+        with self.lock:
+            digests = self.entries.get(key)
+            if digests is None:
+                return {}
+            self.entries.move_to_end(key)
+            return digests
+
+    def put(self, key: FileKey, digests: Dict[str, str]):
+        """Add digests of a file version"""
+        with self.lock:
+            self.entries[key] = {**self.entries.get(key, {}), **digests}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all files from the cache"""
+        with self.lock:
+            self.entries.clear()
+
+
+checksum_cache = ChecksumCache()
+
+
+def hash_stream(
+    stream: IO[bytes],
+    algorithms: Iterable[str] = (CRC32C,),
+    buffer_size: int = CHECKSUM_BUFFER_SIZE,
+) -> Dict[str, str]:
+    """Compute the digests of the rest of a binary stream in one pass"""
+    hasher = Hasher(algorithms)
+    while True:
+        data = stream.read(buffer_size)
+        if not data:
+            break
+        hasher.update(data)
+    return hasher.digests()
+
+
+def file_digests(
+    filename: str, algorithms: Iterable[str] = (CRC32C,)
+) -> Dict[str, str]:
+    """Get the digests of a local file (cached), reading it at most once"""
+    algorithms = list(algorithms)
+    key = checksum_cache.key(filename)
+    digests = checksum_cache.get(key)
+    missing = [algorithm for algorithm in algorithms if algorithm not in digests]
+    if missing:
+        with open(filename, "rb", buffering=0) as r:
+            digests = {**digests, **hash_stream(r, missing)}
+        checksum_cache.put(key, digests)
+    return {algorithm: digests[algorithm] for algorithm in algorithms}
+
+
+def file_crc32c(filename: str) -> str:
+    """Get the crc32c of a local file (cached)"""
+    return file_digests(filename, (CRC32C,))[CRC32C]
+
+
+def copy_file(
+    source: str, dest: str, algorithms: Iterable[str] = (CRC32C,)
+) -> Dict[str, str]:
+    """Copy a local file, computing its digests from the same read
+
+    The digests are cached for both the source and the copy.
+    """
+    hasher = Hasher(algorithms)
+    with open(source, "rb") as r, open(dest, "wb") as w:
+        shutil.copyfileobj(HashingReader(r, hasher), w, CHECKSUM_BUFFER_SIZE)
+    digests = hasher.digests()
+    checksum_cache.put(checksum_cache.key(source), digests)
+    checksum_cache.put(checksum_cache.key(dest), digests)
+    return digests
+
+
+def put_gcs_crc32c(key: FileKey, crc32c: Optional[str]):
+    """Cache the crc32c of a file version transferred to/from GCS
+
+    GCS reports crc32c as standard base64, so is re-encoded.
+    """
+    if crc32c:
+        checksum_cache.put(key, {CRC32C: encode_digest(base64.b64decode(crc32c))})
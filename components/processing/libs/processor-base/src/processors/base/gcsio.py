@@ -18,21 +18,46 @@
 """
 import base64
 import contextlib
-import functools
+import dataclasses
 import hashlib
 import json
 import logging
 import mimetypes
 import os
-import re
 import shutil
+import socket
 import tempfile
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterator, Optional, TypeVar
-
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Protocol,
+    Tuple,
+    TypeVar,
+)
+
+import google.auth
+from google.api_core import exceptions
 from google.api_core.client_info import ClientInfo
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.cloud import storage  # type: ignore[attr-defined, import-untyped]
+from google.cloud.storage import (  # type: ignore[import-untyped]
+    transfer_manager,
+)
+from google.cloud.storage.batch import Batch  # type: ignore[import-untyped]
+from processors.base import checksum
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +65,33 @@ logger = logging.getLogger(__name__)
 # Update the timeout for operations
 storage._DEFAULT_TIMEOUT = 300  # pyright: ignore  pylint: disable=protected-access
 
+# Maximum pooled HTTP connections per host, shared by all threads
+GCS_MAX_CONNECTIONS = int(os.environ.get("GCS_MAX_CONNECTIONS", "64"))
+
+# Read-ahead buffer size when streaming objects with ranged reads
+GCS_READ_CHUNK_SIZE = int(os.environ.get("GCS_READ_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Objects at least this size are transferred in parallel chunks
+GCS_SLICED_THRESHOLD = int(
+    os.environ.get("GCS_SLICED_THRESHOLD", str(64 * 1024 * 1024))
+)
+GCS_SLICED_CHUNK_SIZE = int(
+    os.environ.get("GCS_SLICED_CHUNK_SIZE", str(32 * 1024 * 1024))
+)
+GCS_SLICED_WORKERS = int(os.environ.get("GCS_SLICED_WORKERS", "8"))
+
+# Number of concurrent transfers when synchronising folders
+GCS_SYNC_WORKERS = int(os.environ.get("GCS_SYNC_WORKERS", "16"))
+
+# Maximum number of operations in a batch request
+GCS_MAX_BATCH_SIZE = 100
+
+# Seconds that cached object metadata is trusted
+GCS_METADATA_TTL = float(os.environ.get("GCS_METADATA_TTL", "300"))
+
+# Objects whose metadata is cached (the least recently used are evicted)
+GCS_METADATA_CACHE_SIZE = int(os.environ.get("GCS_METADATA_CACHE_SIZE", "10000"))
+
 
 def GCS_TMP_PREFIX():  # pylint: disable=invalid-name
     """Return the temporary GCS location"""
@@ -59,75 +111,314 @@ def get_mimetype(path: str) -> str:
     return "application/octet-stream"
 
 
+@dataclasses.dataclass(frozen=True)
+class ObjectMetadata:
+    """Metadata of a GCS object"""
+
+    size: int
+    crc32c: str
+    content_type: Optional[str] = None
+    generation: Optional[int] = None
+
+    @classmethod
+    def from_blob(cls, blob: storage.Blob) -> "ObjectMetadata":
+        """Get the metadata from a listed or reloaded blob"""
+        return cls(
+            size=blob.size,  # pyright: ignore
+            crc32c=blob.crc32c,  # pyright: ignore
+            content_type=blob.content_type,
+            generation=blob.generation,
+        )
+
+
+class MetadataCache:
+    """MetadataCache - per-process cache of GCS object metadata
+
+    Populated from listings and reloads, entries expire after the TTL and are
+    invalidated when the object is written, moved or deleted by this process.
+    At most max_size objects are cached, so listing a large folder only keeps
+    the metadata of the objects most recently listed or used.
+    """
+
+    def __init__(
+        self, ttl: float = GCS_METADATA_TTL, max_size: int = GCS_METADATA_CACHE_SIZE
+    ):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[float, ObjectMetadata]]" = OrderedDict()
+
+    def get(self, uri: str) -> Optional[ObjectMetadata]:
+        """Get the metadata of the object if cached and not expired"""
+        with self.lock:
+            entry = self.entries.get(uri)
+            if entry is None:
+                return None
+            cached_at, metadata = entry
+            if time.monotonic() - cached_at > self.ttl:
+                del self.entries[uri]
+                return None
+            self.entries.move_to_end(uri)
+            return metadata
+
+    def put(self, uri: str, blob: storage.Blob) -> Optional[ObjectMetadata]:
+        """Cache the metadata of a blob (if it has been loaded)"""
+        if blob.crc32c is None or blob.size is None:
+            return None
+        metadata = ObjectMetadata.from_blob(blob)
+        with self.lock:
+            self.entries[uri] = (time.monotonic(), metadata)
+            self.entries.move_to_end(uri)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return metadata
+
+    def invalidate(self, uri: str):
+        """Remove the object from the cache"""
+        with self.lock:
+            self.entries.pop(uri, None)
+
+    def clear(self):
+        """Remove all objects from the cache"""
+        with self.lock:
+            self.entries.clear()
+
+
+metadata_cache = MetadataCache()
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive on pooled connections"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        # A copy of the defaults with keep-alive (pyright misreads their type)
+        kwargs["socket_options"] = list(
+            HTTPConnection.default_socket_options  # pyright: ignore
+        ) + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        super().init_poolmanager(*args, **kwargs)
+
+
+class SharedAuthorizedSession(AuthorizedSession):
+    """AuthorizedSession shared by all threads
+
+    The connection pools are urllib3's, which are thread-safe, and the adapters
+    are mounted before the session is shared (the storage API sets no cookies,
+    the other state of a session). The credentials are not locked, so expired
+    credentials are refreshed here under a lock, once rather than by every
+    thread that finds them expired.
+    """
+
+    def __init__(self, credentials, **kwargs):
+        super().__init__(credentials, **kwargs)
+        self.refresh_lock = threading.Lock()
+        self.refresh_request = Request()
+
+    def request(self, method, url, *args, **kwargs):
+        if not self.credentials.valid:
+            with self.refresh_lock:
+                if not self.credentials.valid:
+                    self.credentials.refresh(self.refresh_request)
+        return super().request(method, url, *args, **kwargs)
+
+
+def create_storage_client(max_connections: int = GCS_MAX_CONNECTIONS):
+    """Create a storage client with a connection pool sized for concurrent use
+
+    The underlying session is shared by all threads, so the pool allows up to
+    max_connections to be reused per host rather than re-connecting.
+    """
+    credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+
+    session = SharedAuthorizedSession(credentials)
+    adapter = KeepAliveHTTPAdapter(
+        pool_connections=max_connections,
+        pool_maxsize=max_connections,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    kwargs = {}
+    if project:
+        kwargs["project"] = project
+    return storage.Client(
+        credentials=credentials,
+        _http=session,
+        client_info=ClientInfo(
+            user_agent="cloud-solutions/eks-doc-processors-v1",
+        ),
+        **kwargs,
+    )
+
+
+class StorageClient(Protocol):
+    """Storage backend of GCSPath, storage.Client or compatible (MemoryClient)"""
+
+    def bucket(self, bucket_name: str, /) -> Any: ...
+
+
 TGCSPath = TypeVar("TGCSPath", bound="GCSPath")  # pylint: disable=invalid-name
 
 
 class GCSPath:
-    """GCSPath - abstraction for a path that can be a local or GCS object or path"""
+    """GCSPath - abstraction for a path that can be a local or GCS object or path
+
+    Paths are parsed, buckets bound and properties computed on first use, so
+    that constructing paths (e.g. when listing) is cheap.
+    """
 
-    client: Optional[storage.Client] = None
+    __slots__ = (
+        "paths",
+        "preset_crc32c",
+        # Lazy attributes, set on first access
+        "bucket_name",
+        "path",
+        "bucket",
+        "friendly_path",
+        "suffix",
+        "name",
+        "mimetype",
+        "crc32c",
+        "size",
+        "hash",
+    )
+
+    client: Optional[StorageClient] = None
+    buckets: Dict[str, storage.Bucket] = {}
+    client_lock = threading.RLock()
+    max_connections = GCS_MAX_CONNECTIONS
 
     @classmethod
-    def open_bucket(cls, bucket: str):
-        """Open a bucket."""
+    def configure(cls, max_connections: int):
+        """Configure the connection pool (replacing any existing client)"""
+        with cls.client_lock:
+            cls.max_connections = max_connections
+            cls.client = None
+            cls.buckets = {}
+
+    @classmethod
+    def use_client(cls, client: Optional[StorageClient]):
+        """Use a storage client, or a compatible backend such as MemoryClient
+
+        Passing None reverts to creating the default storage client.
+        """
+        with cls.client_lock:
+            cls.client = client
+            cls.buckets = {}
+            metadata_cache.clear()
+
+    @classmethod
+    def is_native_client(cls) -> bool:
+        """Return if the storage client is the GCS client (not a fake)"""
+        return isinstance(cls.get_client(), storage.Client)
+
+    @classmethod
+    def get_client(cls) -> StorageClient:
+        """Get the (shared) storage client"""
         if cls.client is None:
-            cls.client = storage.Client(
-                client_info=ClientInfo(
-                    user_agent="cloud-solutions/eks-doc-processors-v1",
-                )
-            )
-        return cls.client.bucket(bucket)  # pyright: ignore
+            with cls.client_lock:
+                if cls.client is None:
+                    cls.client = create_storage_client(cls.max_connections)
+        return cls.client
+
+    @classmethod
+    def open_bucket(cls, bucket: str):
+        """Open a bucket (cached, so handles are shared between paths)."""
+        handle = cls.buckets.get(bucket)
+        if handle is None:
+            with cls.client_lock:
+                handle = cls.buckets.get(bucket)
+                if handle is None:
+                    handle = cls.get_client().bucket(bucket)
+                    cls.buckets[bucket] = handle
+        return handle
 
     def __init__(
         self,
         *paths: TGCSPath | str,
         crc32c: Optional[str] = None,
     ):
-        self.bucket: Optional[storage.Bucket] = None
-        self.path: str
+        self.paths = paths
         self.preset_crc32c = crc32c
 
-        gcs_test_path = "/".join([str(x) for x in paths])
-        gcs_match = re.match(r"gs://([^/]+)/(.*)", gcs_test_path)
-        if gcs_match:
-            self.bucket = self.open_bucket(gcs_match.group(1))
-            self.path = gcs_match.group(2)
+    def __getattr__(self, attr: str):
+        # Only called for lazy attributes not yet set, so compute and keep them
+        compute = LAZY_ATTRIBUTES.get(attr)
+        if compute is None:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{attr}'"
+            )
+        value = compute(self)
+        setattr(self, attr, value)
+        return value
+
+    def __reduce__(self):
+        # Pickle only the path, not the lazy attributes (or bucket handle)
+        return (
+            type(self),
+            (self.friendly_path,),
+            (None, {"preset_crc32c": self.preset_crc32c}),
+        )
+
+    def parse(self) -> Tuple[Optional[str], str]:
+        """Parse the paths into the bucket name (None if local) and path"""
+        if len(self.paths) == 1:
+            joined = str(self.paths[0])
         else:
-            self.path = str(Path(*[str(p) for p in paths]).resolve())
+            joined = "/".join([str(x) for x in self.paths])
+
+        if joined.startswith("gs://"):
+            bucket_name, sep, path = joined[5:].partition("/")
+            if bucket_name and sep:
+                self.bucket_name = bucket_name
+                self.path = path
+                return bucket_name, path
+
+        # Normalised without touching the filesystem (unlike Path.resolve)
+        self.bucket_name = None
+        self.path = os.path.abspath(os.path.join(*[str(p) for p in self.paths]))
+        return None, self.path
 
     def is_gcs(self) -> bool:
         """Return if the path is GCS or not (local filesystem)"""
-        if self.bucket:
+        if self.bucket_name:
             return True
         return False
 
     # Only valid if it is GCS
     def as_gcs_link(self):
         """Return HTTPS storage link or file:// for path"""
-        if self.bucket:
+        if self.bucket_name:
             return (
                 '<a href="https://storage.cloud.google.com/'
-                + f'{self.bucket.name}/{self.path}">{str(self)}</a>'
+                + f'{self.bucket_name}/{self.path}">{str(self)}</a>'
             )
         return f'<a href="file://{self.path}">{str(self)}</a>'
 
     # See if the file or object exists
     def exists(self) -> bool:
         """Return if object or path exists"""
-        if self.bucket:
+        if self.bucket_name:
+            if metadata_cache.get(self.friendly_path):
+                return True
             return self.bucket.blob(self.path).exists()
         return Path(self.path).exists()
 
     # Open file/blob for read/write
-    def open(self, mode, encoding=None):
-        """Open for reading/writing"""
+    def open(self, mode, encoding=None, chunk_size: Optional[int] = None):
+        """Open for reading/writing
+
+        For objects, chunk_size is the size of each request (buffered in memory),
+        a multiple of 256KB.
+        """
         logger.debug("Opening %s with open %s", str(self), mode)
-        if self.bucket:
+        if self.bucket_name:
+            kwargs = {"chunk_size": chunk_size} if chunk_size else {}
             if mode[0] == "w":
+                metadata_cache.invalidate(self.friendly_path)
                 return self.bucket.blob(self.path).open(
-                    content_type=self.mimetype, mode=mode
+                    content_type=self.mimetype, mode=mode, **kwargs
                 )
-            return self.bucket.blob(self.path).open(mode=mode)
+            return self.bucket.blob(self.path).open(mode=mode, **kwargs)
 
         # if writing, ensure output folder exists
         if mode[0] == "w":
@@ -141,8 +432,12 @@ class GCSPath:
         self.copy(dest, delete_orig=True)
 
     # Copy objects / files
-    def copy(self, idest: str | TGCSPath, delete_orig=False):
-        """Move current object (file) to a target object (file), optionally deleting original"""
+    def copy(self, idest: str | TGCSPath, delete_orig=False, verify=False):
+        """Move current object (file) to a target object (file), optionally deleting original
+
+        If verify, local copies are hashed as they are copied (caching the
+        crc32c of both files), otherwise copied with the fastest method.
+        """
 
         if isinstance(idest, str):
             dest = GCSPath(idest)
@@ -160,13 +455,14 @@ class GCSPath:
             token, _, _ = dst.rewrite(source=src)
             while token is not None:
                 token, _, _ = dst.rewrite(source=src, token=token)
+            metadata_cache.put(dest.friendly_path, dst)
 
         # Make local directories if necessary
-        if not dest.bucket:
+        if not dest.bucket_name:
             os.makedirs(Path(dest.path).parent, exist_ok=True)
 
-        if self.bucket:
-            if dest.bucket:
+        if self.bucket_name:
+            if dest.bucket_name:
                 logger.debug("Copying remotely from %s to %s", str(self), str(dest))
                 gcs_rewrite(self, dest)
                 if delete_orig:
@@ -174,17 +470,14 @@ class GCSPath:
             else:
                 # Download from GCS
                 logger.debug("Downloading from %s to %s", str(self), str(dest))
-                self.bucket.blob(self.path).download_to_filename(dest.path)
+                self.download_to_filename(dest.path)
                 if delete_orig:
                     self.delete()
         else:
-            if dest.bucket:
+            if dest.bucket_name:
                 # Upload to GCS
                 logger.debug("Uploading from %s to %s", str(self), str(dest))
-                dest.bucket.blob(dest.path).upload_from_filename(
-                    str(self),
-                    content_type=get_mimetype(dest.path),
-                )
+                dest.upload_from_filename(str(self))
                 if delete_orig:
                     self.delete()
             else:
@@ -192,6 +485,10 @@ class GCSPath:
                     # Move locally
                     logger.debug("Moving locally from %s to %s", str(self), str(dest))
                     Path(self.path).rename(dest.path)
+                elif verify:
+                    # Copy locally, hashing the data copied
+                    logger.debug("Copying locally from %s to %s", str(self), str(dest))
+                    checksum.copy_file(self.path, dest.path)
                 else:
                     # Copy locally
                     logger.debug("Copying locally from %s to %s", str(self), str(dest))
@@ -201,10 +498,11 @@ class GCSPath:
     def write_text(self, txt, encoding="utf8"):
         """Write text to the object or file"""
         logger.debug("Writing text to %s", str(self))
-        if self.bucket:
-            self.bucket.blob(self.path).upload_from_string(
-                txt, content_type=self.mimetype
-            )
+        if self.bucket_name:
+            blob = self.bucket.blob(self.path)
+            metadata_cache.invalidate(self.friendly_path)
+            blob.upload_from_string(txt, content_type=self.mimetype)
+            metadata_cache.put(self.friendly_path, blob)
             return
 
         os.makedirs(Path(self.path).parent, exist_ok=True)
@@ -216,12 +514,15 @@ class GCSPath:
     def write_bytes(self, b):
         """Write bytes to the object or file"""
         logger.debug("Writing bytes to %s", str(self))
-        if self.bucket:
-            self.bucket.blob(self.path).upload_from_string(
-                b, content_type=self.mimetype
-            )
+        if self.bucket_name:
+            blob = self.bucket.blob(self.path)
+            metadata_cache.invalidate(self.friendly_path)
+            blob.upload_from_string(b, content_type=self.mimetype)
+            metadata_cache.put(self.friendly_path, blob)
             return
 
+        os.makedirs(Path(self.path).parent, exist_ok=True)
+
         with open(self.path, mode="wb") as w:
             w.write(b)
 
@@ -229,7 +530,7 @@ class GCSPath:
     def read_text(self, encoding="utf8"):
         """Read text from the object or file"""
         logger.debug("Read text from %s", str(self))
-        if self.bucket:
+        if self.bucket_name:
             return self.bucket.blob(self.path).download_as_text()
 
         with open(self.path, mode="rt", encoding=encoding) as r:
@@ -239,31 +540,38 @@ class GCSPath:
     def read_bytes(self):
         """Read bytes from the object or file"""
         logger.debug("Read bytes from %s", str(self))
-        if self.bucket:
+        if self.bucket_name:
             return self.bucket.blob(self.path).download_as_bytes()
 
         with open(self.path, mode="rb") as r:
             return r.read()
 
     # List within the folder or GCS prefix
-    def list(self):
-        """List folders or objects below the path"""
+    def list(self, page_size: Optional[int] = None):
+        """List folders or objects below the path
+
+        Objects are yielded as each listing page is returned, rather than
+        after the full listing is complete.
+        """
         logger.debug("Listing %s", str(self))
-        if self.bucket:
-            for blob in self.bucket.list_blobs(prefix=self.path):
-                yield GCSPath(
-                    f"gs://{self.bucket.name}/{blob.name}", crc32c=blob.crc32c
-                )
+        if self.bucket_name:
+            blobs = self.bucket.list_blobs(prefix=self.path, page_size=page_size)
+            for page in blobs.pages:
+                for blob in page:
+                    uri = f"gs://{self.bucket_name}/{blob.name}"
+                    metadata_cache.put(uri, blob)
+                    yield GCSPath(uri, crc32c=blob.crc32c)
         else:
             for root, _, files in os.walk(self.path):
                 for file in files:
-                    yield GCSPath(str(Path(root, file)))
+                    yield GCSPath(os.path.join(root, file))
 
     # Delete the file or object
     def delete(self):
         """Delete the file or object"""
-        if self.bucket:
+        if self.bucket_name:
             logger.debug("Deleting object %s", str(self))
+            metadata_cache.invalidate(self.friendly_path)
             self.bucket.delete_blob(self.path)
         else:
             logger.debug("Deleting file %s", str(self))
@@ -276,15 +584,35 @@ class GCSPath:
         logger.debug("Reading %s as file locally", str(self))
 
         # If a file, read directly
-        if not self.bucket:
+        if not self.bucket_name:
             yield str(self)
             return
 
         with tempfile.NamedTemporaryFile(suffix=self.suffix) as w:
             logger.debug("Downloading to local file %s", w.name)
-            self.bucket.blob(self.path).download_to_filename(w.name)
+            self.download_to_filename(w.name)
             yield w.name
 
+    # Open for reading as a stream
+    @contextlib.contextmanager
+    def read_as_stream(
+        self, chunk_size: int = GCS_READ_CHUNK_SIZE
+    ) -> Iterator[IO[bytes]]:
+        """Read the file or object as a seekable binary stream
+
+        Objects are read with ranged requests as the stream is read, buffering
+        chunk_size bytes ahead, rather than downloaded to a local file first.
+        """
+        logger.debug("Reading %s as stream", str(self))
+
+        if not self.bucket_name:
+            with open(self.path, mode="rb") as r:
+                yield r
+            return
+
+        with self.bucket.blob(self.path).open(mode="rb", chunk_size=chunk_size) as r:
+            yield r
+
     # Open for reading as an object
     @contextlib.contextmanager
     def read_as_obj(self):
@@ -292,14 +620,14 @@ class GCSPath:
         logger.debug("Reading %s as GCS object", str(self))
 
         # As a bucket, read directly
-        if self.bucket:
+        if self.bucket_name:
             yield str(self)
             return
 
         # Generate a temporary object
         tmp_obj_name = Path(self.path).name
         tmp_obj = GCSPath(
-            f"{GCS_TMP_PREFIX}/tmp-prefix-{str(uuid.uuid4())}/{tmp_obj_name}"
+            f"{GCS_TMP_PREFIX()}/tmp-prefix-{str(uuid.uuid4())}/{tmp_obj_name}"
         )
 
         # Upload it to GCS
@@ -316,17 +644,14 @@ class GCSPath:
         logger.debug("Writing %s as file locally", str(self))
 
         # If a file, read directly (make sure created first)
-        if not self.bucket:
+        if not self.bucket_name:
             os.makedirs(Path(self.path).parent, exist_ok=True)
             yield str(self)
             return
 
         with tempfile.NamedTemporaryFile(suffix=self.suffix) as w:
             yield w.name
-            self.bucket.blob(self.path).upload_from_filename(
-                w.name,
-                content_type=get_mimetype(self.path),
-            )
+            self.upload_from_filename(w.name)
 
     # Open for writing as an object
     @contextlib.contextmanager
@@ -335,14 +660,14 @@ class GCSPath:
         logger.debug("Writing %s as GCS object", str(self))
 
         # As a bucket, read directly
-        if self.bucket:
+        if self.bucket_name:
             yield str(self)
             return
 
         # Generate a temporary object
         tmp_obj_name = Path(self.path).name
         tmp_obj = GCSPath(
-            f"{GCS_TMP_PREFIX}/tmp-prefix-{str(uuid.uuid4())}/{tmp_obj_name}"
+            f"{GCS_TMP_PREFIX()}/tmp-prefix-{str(uuid.uuid4())}/{tmp_obj_name}"
         )
 
         # Write as the object
@@ -361,23 +686,39 @@ class GCSPath:
         logger.debug("Writing to %s as GCS folder", str(self))
 
         # As GCS, use the prefix directly
-        if self.bucket:
+        if self.bucket_name:
             yield str(self)
             return
 
         # Generate a temporary prefix
-        tmp_obj = GCSPath(f"{GCS_TMP_PREFIX}/tmp-prefix-{str(uuid.uuid4())}")
+        tmp_obj = GCSPath(f"{GCS_TMP_PREFIX()}/tmp-prefix-{str(uuid.uuid4())}")
 
         # Return temporary GCS directory
         yield str(tmp_obj)
 
         # Download objects to filesystem
-        for path in tmp_obj.list():
-            # Copy locally
+        start = time.monotonic()
+        objs = list(tmp_obj.list())
+
+        def download(path: GCSPath):
             path.copy(str(Path(self.path, Path(path.path).relative_to(tmp_obj.path))))
 
-            # Remove the object
-            path.delete()
+        with ThreadPoolExecutor(max_workers=GCS_SYNC_WORKERS) as executor:
+            list(executor.map(download, objs))
+        size = sum(path.size for path in objs)
+
+        # Remove the objects
+        result = delete_many(objs)
+        for path, error in result.failed.items():
+            logger.warning("Failed to delete temporary object %s: %s", path, error)
+
+        logger.info(
+            "Downloaded %d objects (%d bytes) to %s in %.2fs",
+            len(objs),
+            size,
+            str(self),
+            time.monotonic() - start,
+        )
 
     # Open folder for writing (sync'd with GCS)
     @contextlib.contextmanager
@@ -385,7 +726,7 @@ class GCSPath:
         """Writable local folder that will uploaded if necessary."""
         logger.debug("Writing to %s as local folder", str(self))
 
-        if not self.bucket:
+        if not self.bucket_name:
             yield str(self.path)
             return
 
@@ -396,14 +737,106 @@ class GCSPath:
             yield d
 
             # Upload objects to GCS
-            for root, _, files in os.walk(d):
-                for file in files:
-                    obj_path = str(Path(self.path, Path(root).relative_to(d), file))
-                    logger.debug("Uploading %s to %s", Path(root, file), obj_path)
-                    self.bucket.blob(obj_path).upload_from_filename(
-                        Path(root, file),
-                        content_type=get_mimetype(obj_path),
-                    )
+            start = time.monotonic()
+            files = [
+                Path(root, file) for root, _, files in os.walk(d) for file in files
+            ]
+
+            def upload(file: Path):
+                obj_path = str(Path(self.path, file.relative_to(d)))
+                logger.debug("Uploading %s to %s", file, obj_path)
+                GCSPath(f"gs://{self.bucket_name}/{obj_path}").upload_from_filename(
+                    str(file)
+                )
+
+            with ThreadPoolExecutor(max_workers=GCS_SYNC_WORKERS) as executor:
+                list(executor.map(upload, files))
+
+            logger.info(
+                "Uploaded %d files (%d bytes) to %s in %.2fs",
+                len(files),
+                sum(os.path.getsize(file) for file in files),
+                str(self),
+                time.monotonic() - start,
+            )
+
+    def upload_from_filename(self, filename: str):
+        """Upload (or copy) a local file to the object or file"""
+        if not self.bucket_name:
+            os.makedirs(Path(self.path).parent, exist_ok=True)
+            shutil.copyfile(filename, self.path)
+            return
+
+        blob = self.bucket.blob(self.path)
+        metadata_cache.invalidate(self.friendly_path)
+
+        # Large files are uploaded as an XML multipart upload of parallel
+        # parts, each validated with an MD5 checksum
+        if (
+            os.path.getsize(filename) >= GCS_SLICED_THRESHOLD
+            and self.is_native_client()
+        ):
+            logger.debug("Uploading %s to %s in parts", filename, str(self))
+            transfer_manager.upload_chunks_concurrently(
+                filename,
+                blob,
+                content_type=self.mimetype,
+                chunk_size=GCS_SLICED_CHUNK_SIZE,
+                worker_type=transfer_manager.THREAD,
+                max_workers=GCS_SLICED_WORKERS,
+                checksum="md5",
+            )
+            return
+
+        # The crc32c computed by GCS is also that of the file uploaded
+        key = checksum.checksum_cache.key(filename)
+        blob.upload_from_filename(filename, content_type=self.mimetype)
+        metadata_cache.put(self.friendly_path, blob)
+        checksum.put_gcs_crc32c(key, blob.crc32c)
+
+    def download_to_filename(self, filename: str):
+        """Download (or copy) the object or file to a local file"""
+        if not self.bucket_name:
+            os.makedirs(Path(filename).parent, exist_ok=True)
+            shutil.copyfile(self.path, filename)
+            return
+
+        blob = self.bucket.blob(self.path)
+
+        # Large objects are downloaded as parallel slices, validating the
+        # crc32c of the whole object once reassembled. Only if the size is
+        # already known (e.g. from the listing), rather than reloading for it
+        metadata = metadata_cache.get(self.friendly_path)
+        if (
+            metadata is not None
+            and metadata.size >= GCS_SLICED_THRESHOLD
+            and self.is_native_client()
+        ):
+            logger.debug("Downloading %s to %s in slices", str(self), filename)
+            transfer_manager.download_chunks_concurrently(
+                blob,
+                filename,
+                chunk_size=GCS_SLICED_CHUNK_SIZE,
+                worker_type=transfer_manager.THREAD,
+                max_workers=GCS_SLICED_WORKERS,
+                crc32c_checksum=True,
+            )
+        else:
+            blob.download_to_filename(filename)
+
+        # Known if the object was validated against it (e.g. sliced downloads)
+        checksum.put_gcs_crc32c(checksum.checksum_cache.key(filename), blob.crc32c)
+
+    def metadata(self) -> ObjectMetadata:
+        """Get the metadata of the object (cached, or with a single reload)"""
+        metadata = metadata_cache.get(self.friendly_path)
+        if metadata is None:
+            blob = self.bucket.blob(self.path)  # pyright: ignore
+            blob.reload()
+            metadata = metadata_cache.put(self.friendly_path, blob)
+            if metadata is None:
+                metadata = ObjectMetadata.from_blob(blob)
+        return metadata
 
     def __str__(self) -> str:
         return self.friendly_path
@@ -436,62 +869,195 @@ class GCSPath:
             )[:-1]
         )
 
-    @functools.cached_property
-    def hash(self, extra=None) -> str:
-        """Get the hash ID of the file or object as a string"""
-        return self.get_hash(extra=extra)
+    def get_bucket(self) -> Optional[storage.Bucket]:
+        """Get the (shared) bucket handle, None if local"""
+        if self.bucket_name:
+            return self.open_bucket(self.bucket_name)
+        return None
 
-    @functools.cached_property
-    def friendly_path(self) -> str:
+    def get_friendly_path(self) -> str:
         """Get the friendly path as a string"""
-        if self.bucket:
-            return f"gs://{self.bucket.name}/{self.path}"
+        if self.bucket_name:
+            return f"gs://{self.bucket_name}/{self.path}"
         return str(self.path)
 
-    @functools.cached_property
-    def suffix(self) -> str:
+    def get_suffix(self) -> str:
         """Get the suffix (extension) of the file or object"""
         return Path(self.path).suffix
 
-    @functools.cached_property
-    def name(self) -> str:
+    def get_name(self) -> str:
         """Get the basename of the file or object"""
         return Path(self.path).name
 
-    @functools.cached_property
-    def mimetype(self) -> str:
+    def get_mimetype(self) -> str:
         """Get the inferred mimetype  of the file or object"""
         return get_mimetype(self.path)
 
-    @functools.cached_property
-    def crc32c(self) -> str:
+    def get_crc32c(self) -> str:
         """Get the crc32c of the file or object"""
         if self.preset_crc32c:
             return self.preset_crc32c
 
-        if self.bucket:
-            obj = self.bucket.blob(self.path)
-            obj.reload()
-            return obj.crc32c
-
-        # Calculate from local filesystem
-        from google_crc32c import Checksum  # pylint: disable=import-outside-toplevel
-
-        crc32c = Checksum()
-        size = 4096
-        with open(self.path, "rb") as f:
-            while True:
-                b = f.read(size)
-                if not b:
-                    break
-                crc32c.update(b)
-        return str(base64.urlsafe_b64encode(crc32c.digest()), "utf8")
-
-    @functools.cached_property
-    def size(self) -> int:
+        if self.bucket_name:
+            return self.metadata().crc32c
+
+        # Calculate from local filesystem (or cached)
+        return checksum.file_crc32c(self.path)
+
+    def get_size(self) -> int:
         """Return the size (in bytes) of the object or file"""
-        if self.bucket:
-            obj = self.bucket.blob(self.path)
-            obj.reload()
-            return obj.size  # pyright: ignore
+        if self.bucket_name:
+            return self.metadata().size
         return os.path.getsize(self.path)
+
+
+# Computes each lazy attribute of GCSPath on first access
+LAZY_ATTRIBUTES: Dict[str, Callable[[GCSPath], object]] = {
+    "bucket_name": lambda path: path.parse()[0],
+    "path": lambda path: path.parse()[1],
+    "bucket": GCSPath.get_bucket,
+    "friendly_path": GCSPath.get_friendly_path,
+    "suffix": GCSPath.get_suffix,
+    "name": GCSPath.get_name,
+    "mimetype": GCSPath.get_mimetype,
+    "crc32c": GCSPath.get_crc32c,
+    "size": GCSPath.get_size,
+    "hash": GCSPath.get_hash,
+}
+
+
+@dataclasses.dataclass
+class BatchResult:
+    """Outcome of a bulk operation, reporting the operations that failed"""
+
+    succeeded: "list[GCSPath]" = dataclasses.field(default_factory=list)
+    failed: "Dict[GCSPath, Exception]" = dataclasses.field(default_factory=dict)
+
+    def merge(self, other: "BatchResult"):
+        """Merge in the outcome of another operation"""
+        self.succeeded.extend(other.succeeded)
+        self.failed.update(other.failed)
+
+
+class ResponsesBatch(Batch):
+    """Batch of requests, keeping the responses returned when finished"""
+
+    def __init__(self, client: storage.Client):
+        super().__init__(client, raise_exception=False)
+        self.responses: list = []
+
+    def finish(self, raise_exception=True):
+        self.responses = super().finish(raise_exception=raise_exception)
+        return self.responses
+
+
+def run_batched(
+    paths: "list[GCSPath]", operation: "Callable[[GCSPath], None]"
+) -> BatchResult:
+    """Run an operation per object, as batch requests of up to 100 operations
+
+    Each operation must make exactly one request. Failures are reported per
+    object rather than failing the whole batch.
+    """
+    if not paths:
+        return BatchResult()
+    client = GCSPath.get_client()
+    if not isinstance(client, storage.Client):
+        return run_individually(paths, operation)
+
+    result = BatchResult()
+    for i in range(0, len(paths), GCS_MAX_BATCH_SIZE):
+        chunk = paths[i : i + GCS_MAX_BATCH_SIZE]
+        with ResponsesBatch(client) as batch:
+            for path in chunk:
+                operation(path)
+
+        # Responses are in the order of the requests
+        for path, response in zip(chunk, batch.responses):
+            if 200 <= response.status_code < 300:
+                result.succeeded.append(path)
+            else:
+                result.failed[path] = exceptions.from_http_response(response)
+    return result
+
+
+def run_individually(
+    paths: "Iterable[GCSPath]", operation: "Callable[[GCSPath], None]"
+) -> BatchResult:
+    """Run an operation per object or file, reporting any failures"""
+    result = BatchResult()
+    for path in paths:
+        try:
+            operation(path)
+            result.succeeded.append(path)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            result.failed[path] = e
+    return result
+
+
+def delete_many(paths: "Iterable[GCSPath]") -> BatchResult:
+    """Delete objects (with batch requests) or files
+
+    Returns the deleted paths, and the paths that failed with their errors.
+    """
+    paths = list(paths)
+    objs = [path for path in paths if path.bucket_name]
+
+    def delete(path: GCSPath):
+        metadata_cache.invalidate(path.friendly_path)
+        path.bucket.delete_blob(path.path)  # pyright: ignore
+
+    result = run_individually(
+        [path for path in paths if not path.bucket_name], GCSPath.delete
+    )
+    result.merge(run_batched(objs, delete))
+    return result
+
+
+def copy_many(
+    pairs: "Iterable[Tuple[GCSPath, GCSPath]]", delete_orig=False
+) -> BatchResult:
+    """Copy objects (with batch requests) or files to their destinations
+
+    Returns the source paths copied, and the source paths that failed with
+    their errors. Objects too large to copy in one request are rewritten
+    individually.
+    """
+    dests = dict(pairs)
+    objs = [src for src, dst in dests.items() if src.bucket_name and dst.bucket_name]
+
+    def copy(src: GCSPath):
+        dst = dests[src]
+        metadata_cache.invalidate(dst.friendly_path)
+        src.bucket.copy_blob(  # pyright: ignore
+            src.bucket.blob(src.path),  # pyright: ignore
+            dst.bucket,
+            dst.path,
+        )
+
+    result = run_individually(
+        [src for src in dests if src not in objs], lambda src: src.copy(dests[src])
+    )
+    copied = run_batched(objs, copy)
+    result.succeeded.extend(copied.succeeded)
+
+    # Fall back to a rewrite (e.g. large objects across locations/classes)
+    result.merge(
+        run_individually(copied.failed.keys(), lambda src: src.copy(dests[src]))
+    )
+
+    if delete_orig:
+        deleted = delete_many([src for src in result.succeeded])
+        result.succeeded = deleted.succeeded
+        result.failed.update(deleted.failed)
+
+    return result
+
+
+def move_many(pairs: "Iterable[Tuple[GCSPath, GCSPath]]") -> BatchResult:
+    """Move objects (with batch requests) or files to their destinations
+
+    Returns the source paths moved, and the source paths that failed with
+    their errors.
+    """
+    return copy_many(pairs, delete_orig=True)
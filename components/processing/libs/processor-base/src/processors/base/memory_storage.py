@@ -0,0 +1,299 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""In-memory storage backend for GCSPath
+
+    Implements the subset of the google.cloud.storage client used by GCSPath,
+    keeping objects in memory, so gs:// paths can be used offline, e.g.
+
+        GCSPath.use_client(MemoryClient(latency=0.02))
+"""
+
+import base64
+import dataclasses
+import io
+import itertools
+import shutil
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from google.api_core import exceptions
+from google.cloud.storage import fileio
+from google_crc32c import Checksum
+
+# Default number of objects per listing page
+DEFAULT_PAGE_SIZE = 1000
+
+
+def compute_crc32c(data: bytes) -> str:
+    """Compute the crc32c of data, encoded as reported by GCS"""
+    return str(base64.b64encode(Checksum(data).digest()), "utf8")
+
+
+@dataclasses.dataclass(frozen=True)
+class MemoryObject:
+    """An object stored in a MemoryBucket"""
+
+    data: bytes
+    content_type: str
+    generation: int
+    crc32c: str
+
+
+class MemoryWriter(io.BytesIO):
+    """Buffered writer that stores the object when closed"""
+
+    def __init__(self, blob: "MemoryBlob", content_type: Optional[str]):
+        super().__init__()
+        self.blob = blob
+        self.content_type = content_type
+
+    def close(self):
+        if not self.closed:
+            self.blob.upload_from_string(self.getvalue(), self.content_type)
+        super().close()
+
+
+class MemoryBlob:
+    """MemoryBlob - handle to an object, as storage.Blob
+
+    Like storage.Blob, the metadata is only populated once the object has been
+    listed, reloaded or written through this handle.
+    """
+
+    def __init__(self, bucket: "MemoryBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.size: Optional[int] = None
+        self.crc32c: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.generation: Optional[int] = None
+        self.chunk_size: Optional[int] = None
+
+    def set_properties(self, obj: MemoryObject):
+        """Populate the metadata from a stored object"""
+        self.size = len(obj.data)
+        self.crc32c = obj.crc32c
+        self.content_type = obj.content_type
+        self.generation = obj.generation
+
+    def exists(self) -> bool:
+        """Return if the object exists"""
+        self.bucket.client.request()
+        return self.name in self.bucket.objects
+
+    def reload(self):
+        """Load the metadata of the object"""
+        self.set_properties(self.bucket.get_object(self.name))
+
+    def upload_from_string(self, data, content_type: Optional[str] = "text/plain"):
+        """Store the data (bytes, or str encoded as utf8) as the object"""
+        if isinstance(data, str):
+            data = data.encode("utf8")
+        self.set_properties(
+            self.bucket.put_object(
+                self.name, bytes(data), content_type or "application/octet-stream"
+            )
+        )
+
+    def upload_from_filename(self, filename: str, content_type: Optional[str] = None):
+        """Store a local file as the object"""
+        with open(filename, "rb") as r:
+            self.upload_from_string(r.read(), content_type)
+
+    def download_as_bytes(
+        self, start: Optional[int] = None, end: Optional[int] = None, **_
+    ) -> bytes:
+        """Get the data of the object, or the range of bytes start to end
+
+        As GCS, the end is inclusive, and a range starting after the end of
+        the object is not satisfiable.
+        """
+        obj = self.bucket.get_object(self.name)
+        self.set_properties(obj)
+        if start is None and end is None:
+            return obj.data
+        start = start or 0
+        if start and start >= len(obj.data):
+            raise exceptions.RequestRangeNotSatisfiable(
+                f"gs://{self.bucket.name}/{self.name} range {start}-{end}"
+            )
+        return obj.data[start : None if end is None else end + 1]
+
+    def download_as_text(self, encoding: str = "utf8") -> str:
+        """Get the data of the object decoded as text"""
+        return self.download_as_bytes().decode(encoding)
+
+    def download_to_filename(self, filename: str):
+        """Write the data of the object to a local file"""
+        with open(filename, "wb") as w:
+            shutil.copyfileobj(io.BytesIO(self.download_as_bytes()), w)
+
+    def open(
+        self,
+        mode: str = "r",
+        content_type: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        **_,
+    ):
+        """Open the object for reading or writing, as storage.Blob.open
+
+        Reads are made by storage's BlobReader, as ranged downloads of
+        chunk_size bytes as the stream is read.
+        """
+        if mode[0] == "w":
+            writer = MemoryWriter(self, content_type)
+            return writer if "b" in mode else io.TextIOWrapper(writer, "utf8")
+        reader = fileio.BlobReader(self, chunk_size=chunk_size)
+        # BlobReader lacks the name of the typeshed buffer protocol
+        return (
+            reader
+            if "b" in mode
+            else io.TextIOWrapper(reader, "utf8")  # pyright: ignore
+        )
+
+    def rewrite(self, source: "MemoryBlob", token=None):
+        """Copy the source object to this object in a single rewrite"""
+        del token
+        obj = source.bucket.get_object(source.name)
+        self.set_properties(
+            self.bucket.put_object(self.name, obj.data, obj.content_type)
+        )
+        return None, len(obj.data), len(obj.data)
+
+
+class MemoryBlobIterator:
+    """Listing of objects, iterable by page as storage's HTTPIterator"""
+
+    def __init__(self, bucket: "MemoryBucket", prefix: str, page_size: int):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.page_size = page_size
+
+    @property
+    def pages(self) -> Iterator[list[MemoryBlob]]:
+        """Yield the objects a page (request) at a time"""
+        names = sorted(
+            name for name in self.bucket.objects if name.startswith(self.prefix)
+        )
+        for i in itertools.count(step=self.page_size):
+            self.bucket.client.request()
+            page = []
+            for name in names[i : i + self.page_size]:
+                obj = self.bucket.objects.get(name)
+                if obj is not None:
+                    blob = MemoryBlob(self.bucket, name)
+                    blob.set_properties(obj)
+                    page.append(blob)
+            yield page
+            if i + self.page_size >= len(names):
+                return
+
+    def __iter__(self) -> Iterator[MemoryBlob]:
+        for page in self.pages:
+            yield from page
+
+
+class MemoryBucket:
+    """MemoryBucket - bucket of in-memory objects, as storage.Bucket"""
+
+    def __init__(self, client: "MemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self.objects: Dict[str, MemoryObject] = {}
+
+    def blob(self, name: str) -> MemoryBlob:
+        """Get a handle to an object (no request is made)"""
+        return MemoryBlob(self, name)
+
+    def get_object(self, name: str) -> MemoryObject:
+        """Get a stored object, raising NotFound if it does not exist"""
+        self.client.request()
+        obj = self.objects.get(name)
+        if obj is None:
+            raise exceptions.NotFound(f"gs://{self.name}/{name} not found")
+        return obj
+
+    def put_object(self, name: str, data: bytes, content_type: str) -> MemoryObject:
+        """Store an object as a new generation"""
+        self.client.request()
+        obj = MemoryObject(
+            data=data,
+            content_type=content_type,
+            generation=self.client.next_generation(),
+            crc32c=compute_crc32c(data),
+        )
+        with self.client.lock:
+            self.objects[name] = obj
+        return obj
+
+    def list_blobs(
+        self, prefix: str = "", page_size: Optional[int] = None
+    ) -> MemoryBlobIterator:
+        """List the objects with the prefix, in lexicographic order"""
+        return MemoryBlobIterator(self, prefix or "", page_size or DEFAULT_PAGE_SIZE)
+
+    def delete_blob(self, name: str):
+        """Delete an object, raising NotFound if it does not exist"""
+        self.client.request()
+        with self.client.lock:
+            if self.objects.pop(name, None) is None:
+                raise exceptions.NotFound(f"gs://{self.name}/{name} not found")
+
+    def copy_blob(
+        self,
+        blob: MemoryBlob,
+        destination_bucket: "MemoryBucket",
+        new_name: Optional[str] = None,
+    ) -> MemoryBlob:
+        """Copy an object to the destination bucket"""
+        dst = destination_bucket.blob(new_name or blob.name)
+        dst.rewrite(blob)
+        return dst
+
+
+class MemoryClient:
+    """MemoryClient - in-memory storage client, as storage.Client
+
+    Every request to the service sleeps for latency seconds, so the effect of
+    concurrency and request counts can be measured reproducibly. Objects are
+    not shared between processes.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.buckets: Dict[str, MemoryBucket] = {}
+        self.generations = itertools.count(1)
+        self.requests = 0
+
+    def request(self):
+        """Account for (and delay) a request to the service"""
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def next_generation(self) -> int:
+        """Get the next (increasing) object generation"""
+        with self.lock:
+            return next(self.generations)
+
+    def bucket(self, name: str) -> MemoryBucket:
+        """Get the bucket, created on first use"""
+        with self.lock:
+            bucket = self.buckets.get(name)
+            if bucket is None:
+                bucket = self.buckets[name] = MemoryBucket(self, name)
+            return bucket
@@ -0,0 +1,64 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""ProtoRowEncoder for encoding messages as Storage Write API rows"""
+
+import functools
+import operator
+from typing import Iterable, Sequence, Type
+
+import proto
+from google.cloud.bigquery_storage_v1 import types  # type: ignore[import-untyped]
+from google.protobuf import descriptor_pb2
+
+# Raw protobuf classes, avoiding the proto-plus marshalling per row
+_ProtoRowsPb = types.ProtoRows.pb()
+_ProtoDataPb = types.AppendRowsRequest.ProtoData.pb()
+
+_serialize = operator.methodcaller("SerializeToString")
+
+
+class ProtoRowEncoder:
+    """ProtoRowEncoder - encodes messages of one type as serialized rows"""
+
+    def __init__(self, message_type: Type[proto.Message]):
+        self.message_type = message_type
+
+    @functools.cached_property
+    def proto_schema(self) -> types.ProtoSchema:
+        """Get the writer schema for the message type"""
+        proto_descriptor = descriptor_pb2.DescriptorProto()  # pylint: disable=no-member
+        self.message_type.pb().DESCRIPTOR.CopyToProto(proto_descriptor)
+        return types.ProtoSchema(proto_descriptor=proto_descriptor)
+
+    def serialize_rows(self, rows: Iterable[proto.Message]) -> list[bytes]:
+        """Serialize the messages into rows"""
+        return list(map(_serialize, map(self.message_type.pb, rows)))
+
+    def get_proto_data(
+        self, serialized_rows: Sequence[bytes], with_schema: bool = True
+    ) -> types.AppendRowsRequest.ProtoData:
+        """Convert serialized rows into proto data"""
+        proto_data = _ProtoDataPb(rows=_ProtoRowsPb(serialized_rows=serialized_rows))
+
+        # Bring in the schema if requested (required first time)
+        if with_schema:
+            proto_data.writer_schema.CopyFrom(types.ProtoSchema.pb(self.proto_schema))
+
+        return types.AppendRowsRequest.ProtoData.wrap(proto_data)
+
+
+@functools.cache
+def get_encoder(message_type: Type[proto.Message]) -> ProtoRowEncoder:
+    """Get the (shared) encoder for a message type"""
+    return ProtoRowEncoder(message_type)
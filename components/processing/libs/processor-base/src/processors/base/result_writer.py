@@ -13,21 +13,56 @@
 # limitations under the License.
 """"BigQueryWriter for storage writes into a BigQuery table"""
 
+import collections
+import dataclasses
 import functools
 import logging
-from typing import Sequence
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, Sequence
 
 import proto
+from google.api_core import exceptions
 from google.api_core.gapic_v1.client_info import ClientInfo
 from google.cloud import bigquery_storage_v1  # type: ignore[import-untyped]
 from google.cloud.bigquery import TableReference
-from google.cloud.bigquery_storage_v1 import types  # type: ignore[import-untyped]
-from google.protobuf import descriptor_pb2
+from google.cloud.bigquery_storage_v1 import exceptions as bqstorage_exceptions
+from google.cloud.bigquery_storage_v1 import (  # type: ignore[import-untyped]
+    types,
+    writer,
+)
+from google.protobuf import wrappers_pb2
+from processors.base.proto_encoder import ProtoRowEncoder, get_encoder
 
 __protobuf__ = proto.module(package="")
 
 logger = logging.getLogger(__name__)
 
+# AppendRows requests are limited to 10MB, leave room for the request overhead
+MAX_REQUEST_BYTES = 9 * 1024 * 1024
+
+# Approximate overhead of each serialized row within the request
+ROW_OVERHEAD_BYTES = 8
+
+# Errors where the append can be retried
+RETRYABLE_ERRORS = (
+    exceptions.Aborted,
+    exceptions.DeadlineExceeded,
+    exceptions.InternalServerError,
+    exceptions.ResourceExhausted,
+    exceptions.ServiceUnavailable,
+    exceptions.Unknown,
+    bqstorage_exceptions.StreamClosedError,
+)
+
+# Types of write stream that can be appended to
+STREAM_TYPES = {
+    "default": None,
+    "committed": types.WriteStream.Type.COMMITTED,
+    "pending": types.WriteStream.Type.PENDING,
+}
+
 
 class DocumentMetadata(proto.Message):
     """DocumentMetadata for Agent Builder"""
@@ -44,65 +79,334 @@ class DocumentMetadata(proto.Message):
     content = proto.Field(Content, number=3)
 
 
-class BigQueryWriter:
-    """BigQueryWriter - using storage API streaming to insert new records"""
+@dataclasses.dataclass
+class WriterStats:
+    """Counters for the rows appended by a BigQueryWriter"""
 
-    @staticmethod
-    def get_proto_data(obj: Sequence[proto.Message], with_schema: bool = True):
-        """Convert a sequence of messages into proto data"""
+    rows_sent: int = 0
+    bytes_sent: int = 0
+    requests: int = 0
+    in_flight: int = 0
+    retries: int = 0
 
-        proto_data = types.AppendRowsRequest.ProtoData()
 
-        # Bring in the schema if requested (required first time)
-        if with_schema:
-            proto_schema = types.ProtoSchema()
-            proto_descriptor = (
-                descriptor_pb2.DescriptorProto()
-            )  # pylint: disable=no-member
-            type(obj[0]).pb().DESCRIPTOR.CopyToProto(proto_descriptor)
-            proto_schema.proto_descriptor = proto_descriptor
-            proto_data.writer_schema = proto_schema
+@dataclasses.dataclass
+class PendingAppend:
+    """An append request that has been sent, waiting on the response"""
 
-        # Serialize the rows
-        proto_rows = types.ProtoRows()
-        for o in obj:
-            proto_rows.serialized_rows.append(
-                type(o).serialize(o)
-            )  # pylint: disable=no-member
+    request: types.AppendRowsRequest
+    rows: int
+    size: int
+    future: Optional[Future | writer.AppendRowsFuture] = None
+    attempts: int = 0
 
-        proto_data.rows = proto_rows
 
-        return proto_data
+class BigQueryWriter:
+    """BigQueryWriter - using storage API streaming to insert new records"""
+
+    @staticmethod
+    def get_proto_data(obj: Sequence[proto.Message], with_schema: bool = True):
+        """Convert a sequence of messages into proto data"""
+        encoder = get_encoder(type(obj[0]))
+        return encoder.get_proto_data(encoder.serialize_rows(obj), with_schema)
 
-    def __init__(self, table: str):
+    def __init__(
+        self,
+        table: str,
+        max_rows: int = 500,
+        max_bytes: int = MAX_REQUEST_BYTES,
+        max_latency: float = 10.0,
+        max_in_flight: int = 4,
+        stream_type: str = "default",
+        max_retries: int = 5,
+        retry_delay: float = 1.0,
+    ):
         ref = TableReference.from_string(table)
         self.client = bigquery_storage_v1.BigQueryWriteClient(
             client_info=ClientInfo(
                 user_agent="cloud-solutions/eks-doc-processors-v1",
             )
         )
-        self.path = self.client.write_stream_path(
-            project=ref.project,
-            dataset=ref.dataset_id,
-            table=ref.table_id,
-            stream="_default",
-        )
+
+        # Use the default stream (at-least-once), or create an
+        # application stream where offsets give exactly-once appends
+        self.stream_type = STREAM_TYPES[stream_type]
+        if self.stream_type is None:
+            self.path = self.client.write_stream_path(
+                project=ref.project,
+                dataset=ref.dataset_id,
+                table=ref.table_id,
+                stream="_default",
+            )
+        else:
+            self.table_path = self.client.table_path(
+                project=ref.project,
+                dataset=ref.dataset_id,
+                table=ref.table_id,
+            )
+            self.path = self.create_stream()
+        self.offset = 0
+
+        # Flush thresholds
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+
+        # Retries and pipelining of the append requests
+        self.max_in_flight = max(max_in_flight, 1)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.in_flight: collections.deque[PendingAppend] = collections.deque()
+        self.stats = WriterStats()
+
+        # Buffered rows, waiting to be appended
+        self.lock = threading.Lock()
+        self.rows: list[bytes] = []
+        self.rows_bytes = 0
+        self.rows_since: Optional[float] = None
+        self.encoder: Optional[ProtoRowEncoder] = None
+
+        # Appends are sent (and retried) in offset order by one thread at a
+        # time, without holding the lock on the buffered rows
+        self.send_lock = threading.RLock()
+
+        # Long-lived append stream, opened with the first request
+        self.append_stream: Optional[writer.AppendRowsStream] = None
+        self.closed_stream: Optional[writer.AppendRowsStream] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def create_stream(self) -> str:
+        """Create an application stream, returning its path"""
+        write_stream = types.WriteStream()
+        write_stream.type_ = self.stream_type
+        return self.client.create_write_stream(
+            parent=self.table_path, write_stream=write_stream
+        ).name
+
+    def open_stream(self) -> writer.AppendRowsStream:
+        """Open the append stream if necessary (or if it has been closed)
+
+        The writer schema is in the request template, so is only sent
+        with the first request on the stream.
+        """
+        if self.append_stream is self.closed_stream:
+            self.append_stream = None
+        if self.append_stream is None:
+            template = types.AppendRowsRequest()
+            template.write_stream = self.path
+            template.proto_rows = self.encoder.get_proto_data(  # type: ignore
+                [], with_schema=True
+            )
+
+            append_stream = writer.AppendRowsStream(self.client, template)
+            append_stream.add_close_callback(self.on_stream_closed)
+            self.append_stream = append_stream
+        return self.append_stream
+
+    def on_stream_closed(self, append_stream, reason):
+        """Note the append stream is closed, so it is re-opened if needed
+
+        Called on the stream's threads, possibly while an append is waiting on
+        the stream, so no lock is taken.
+        """
+        logger.debug("BigQuery append stream closed: %s", reason)
+        self.closed_stream = append_stream
 
     def write_results(self, results: Sequence[DocumentMetadata]):
-        """Write some results to the table"""
+        """Write some results to the table
+
+        Results are buffered, and appended when a flush threshold is reached.
+        """
 
         if len(results) == 0:
             return
 
-        req = types.AppendRowsRequest()
-        req.write_stream = self.path
-        req.proto_rows = BigQueryWriter.get_proto_data(results)
-
         logger.debug(
-            "Uploading to BigQuery URIs %s",
+            "Buffering BigQuery rows for URIs %s",
             ", ".join([r.content.uri for r in results]),  # pyright: ignore
         )
-        self.client.append_rows(requests=iter([req]))
+
+        batches = []
+        with self.lock:
+            if self.encoder is None:
+                self.encoder = get_encoder(type(results[0]))
+
+            for row in self.encoder.serialize_rows(results):
+                row_bytes = len(row) + ROW_OVERHEAD_BYTES
+                if self.rows and self.rows_bytes + row_bytes > self.max_bytes:
+                    batches.append(self.take_rows())
+
+                self.rows.append(row)
+                self.rows_bytes += row_bytes
+                if self.rows_since is None:
+                    self.rows_since = time.monotonic()
+
+            if (
+                len(self.rows) >= self.max_rows
+                or time.monotonic() - self.rows_since > self.max_latency  # type: ignore
+            ):
+                batches.append(self.take_rows())
+
+        # Appended without the lock, so other threads can buffer rows meanwhile
+        for rows in batches:
+            self.send_rows(rows)
+
+    def take_rows(self) -> list[bytes]:
+        """Take the buffered rows, to be appended"""
+        rows = self.rows
+        self.rows = []
+        self.rows_bytes = 0
+        self.rows_since = None
+        return rows
+
+    def send_rows(self, rows: list[bytes]):
+        """Append the rows to the table, without waiting on the response"""
+
+        if len(rows) == 0:
+            return
+
+        req = types.AppendRowsRequest()
+        req.proto_rows = self.encoder.get_proto_data(  # type: ignore
+            rows, with_schema=False
+        )
+
+        with self.send_lock:
+            if self.stream_type is not None:
+                req.offset = wrappers_pb2.Int64Value(value=self.offset)
+                self.offset += len(rows)
+
+            # Limit the number of requests in flight
+            while len(self.in_flight) >= self.max_in_flight:
+                self.wait_oldest()
+
+            self.send(
+                PendingAppend(request=req, rows=len(rows), size=req._pb.ByteSize())
+            )
+
+    def send(self, pending: PendingAppend):
+        """Send an append request on the stream"""
+        pending.attempts += 1
+        try:
+            pending.future = self.open_stream().send(pending.request)
+        except RETRYABLE_ERRORS as e:
+            # Stream closed under us, the future will report the failure
+            pending.future = Future()
+            pending.future.set_exception(e)
+        self.in_flight.append(pending)
+        self.stats.in_flight = len(self.in_flight)
+
+    def wait_oldest(self):
+        """Wait for the oldest request in flight, retrying it if necessary"""
+        pending = self.in_flight.popleft()
+        self.stats.in_flight = len(self.in_flight)
+        try:
+            pending.future.result()  # type: ignore
+        except exceptions.AlreadyExists:
+            # Offset already written by an earlier attempt
+            pass
+        except RETRYABLE_ERRORS as e:
+            if pending.attempts > self.max_retries:
+                raise
+            self.retry(pending, e)
+            return
+
+        self.stats.rows_sent += pending.rows
+        self.stats.bytes_sent += pending.size
+        self.stats.requests += 1
+
+    def retry(self, pending: PendingAppend, error: Exception):
+        """Retry a failed request, along with everything sent after it
+
+        Requests after a failure fail (or are rejected for their offsets), so
+        they are re-sent in order. With offsets, a request that was already
+        written is reported as AlreadyExists rather than appended twice.
+
+        Called with the send lock held, so no other appends are sent before the
+        retries (rows are still buffered, as the buffer has its own lock).
+        """
+        self.stats.retries += 1
+        delay = self.retry_delay * 2 ** (pending.attempts - 1)
+        logger.warning(
+            "Retrying BigQuery append (attempt %d) in %.1fs: %s",
+            pending.attempts,
+            delay,
+            error,
+        )
+
+        # Cancel the stream, failing everything that is in flight
+        resend = [pending] + list(self.in_flight)
+        self.in_flight.clear()
+        if self.append_stream is not None:
+            self.append_stream.close()
+            self.append_stream = None
+
+        time.sleep(delay)
+        for p in resend:
+            self.send(p)
+
+    def flush(self):
+        """Append any buffered rows to the table, and wait for the responses"""
+        with self.lock:
+            rows = self.take_rows()
+
+        with self.send_lock:
+            self.send_rows(rows)
+            while self.in_flight:
+                self.wait_oldest()
+
+    def commit(self):
+        """Append any buffered rows, and commit the rows appended to the table
+
+        Rows on a pending stream are only visible once it is committed, so the
+        stream is committed and replaced with a new one. Rows on other streams
+        are committed as they are appended.
+        """
+        with self.send_lock:
+            self.flush()
+            if self.stream_type == types.WriteStream.Type.PENDING:
+                self.finish_stream()
+                self.path = self.create_stream()
+                self.offset = 0
+
+    def close(self):
+        """Flush any buffered rows and close the append stream
+
+        Application streams are finalized, and pending streams committed.
+        """
+        with self.send_lock:
+            self.flush()
+            self.finish_stream()
+            logger.info("BigQuery writer %s", self.stats)
+
+    def finish_stream(self):
+        """Close the append stream, finalizing (and committing) the stream"""
+        if self.append_stream is not None:
+            self.append_stream.close()
+            self.append_stream = None
+
+        if self.stream_type is not None and self.path:
+            self.client.finalize_write_stream(name=self.path)
+            if self.stream_type == types.WriteStream.Type.PENDING:
+                self.commit_stream()
+            self.path = ""
+
+    def commit_stream(self):
+        """Commit the (finalized) pending stream, making its rows visible"""
+        response = self.client.batch_commit_write_streams(
+            request=types.BatchCommitWriteStreamsRequest(
+                parent=self.table_path, write_streams=[self.path]
+            )
+        )
+        if response.stream_errors:
+            raise RuntimeError(
+                f"Failed to commit BigQuery stream {self.path}: "
+                + "; ".join(error.error_message for error in response.stream_errors)
+            )
 
 
 @functools.cache
@@ -0,0 +1,89 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import base64
+import hashlib
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from google_crc32c import Checksum
+from processors.base import checksum
+from processors.base.gcsio import GCSPath
+
+
+class TestChecksum(unittest.TestCase):
+
+    def setUp(self):
+        checksum.checksum_cache.clear()
+        self.data = os.urandom(3 * 1024 * 1024 + 17)
+        c = Checksum()
+        c.update(self.data)
+        self.crc32c = str(base64.urlsafe_b64encode(c.digest()), "utf8")
+
+    def test_file_digests(self):
+        with TemporaryDirectory() as d:
+            filename = os.path.join(d, "file")
+            with open(filename, "wb") as w:
+                w.write(self.data)
+
+            digests = checksum.file_digests(
+                filename, [checksum.CRC32C, checksum.SHA256]
+            )
+            self.assertEqual(digests[checksum.CRC32C], self.crc32c)
+            self.assertEqual(
+                digests[checksum.SHA256],
+                checksum.encode_digest(hashlib.sha256(self.data).digest()),
+            )
+
+            # Cached, so the file is not read again
+            with mock.patch("builtins.open", side_effect=AssertionError):
+                self.assertEqual(checksum.file_crc32c(filename), self.crc32c)
+
+            # Modified, so hashed again
+            with open(filename, "ab") as w:
+                w.write(b"more")
+            self.assertNotEqual(checksum.file_crc32c(filename), self.crc32c)
+
+    def test_copy_file(self):
+        with TemporaryDirectory() as d:
+            source = os.path.join(d, "source")
+            dest = os.path.join(d, "dest")
+            with open(source, "wb") as w:
+                w.write(self.data)
+
+            digests = checksum.copy_file(source, dest)
+            self.assertEqual(digests[checksum.CRC32C], self.crc32c)
+            with open(dest, "rb") as r:
+                self.assertEqual(r.read(), self.data)
+
+            with mock.patch("builtins.open", side_effect=AssertionError):
+                self.assertEqual(checksum.file_crc32c(dest), self.crc32c)
+
+    def test_copy_path(self):
+        with TemporaryDirectory() as d:
+            source = GCSPath(d, "source")
+            source.write_bytes(self.data)
+
+            # Copied without hashing, unless verified
+            with mock.patch.object(checksum, "copy_file") as copy_file:
+                source.copy(GCSPath(d, "copy"))
+            copy_file.assert_not_called()
+            self.assertEqual(GCSPath(d, "copy").read_bytes(), self.data)
+
+            source.copy(GCSPath(d, "verified"), verify=True)
+            with mock.patch("builtins.open", side_effect=AssertionError):
+                self.assertEqual(GCSPath(d, "verified").crc32c, self.crc32c)
@@ -14,11 +14,32 @@
 
 
 import base64
+import os
+import pickle
+import socket
+import threading
+import time
 import unittest
 from tempfile import NamedTemporaryFile, TemporaryDirectory
+from unittest import mock
 
+import requests
+from google.auth.credentials import AnonymousCredentials, Credentials
+from google.cloud import storage
+from google.cloud.storage.batch import Batch
 from google_crc32c import Checksum
-from processors.base.gcsio import GCS_TMP_PREFIX, GCSPath, get_mimetype
+from processors.base import gcsio
+from processors.base.gcsio import (
+    GCS_TMP_PREFIX,
+    LAZY_ATTRIBUTES,
+    GCSPath,
+    KeepAliveHTTPAdapter,
+    create_storage_client,
+    delete_many,
+    get_mimetype,
+)
+from processors.base.memory_storage import MemoryClient
+from urllib3.connection import HTTPConnection
 
 
 class TestGCSIO(unittest.TestCase):
@@ -229,3 +250,168 @@ class TestGCSIO(unittest.TestCase):
 
             with open(f.name, "rt") as ft:
                 self.assertTrue(ft.read(), content)
+
+
+def lazy_attributes(path: GCSPath) -> list[str]:
+    """Get the lazy attributes of a path that have been computed"""
+    computed = []
+    for attr in LAZY_ATTRIBUTES:
+        try:
+            getattr(GCSPath, attr).__get__(path)  # the slot, without computing
+            computed.append(attr)
+        except AttributeError:
+            pass
+    return computed
+
+
+class TestGCSPath(unittest.TestCase):
+    """Parses paths lazily, and pickles them as their path"""
+
+    def setUp(self):
+        GCSPath.use_client(MemoryClient())
+        self.addCleanup(GCSPath.use_client, None)
+
+    def test_lazy(self):
+        # Constructed without the client or the filesystem
+        fail = mock.Mock(side_effect=AssertionError("called on construction"))
+        with mock.patch.object(GCSPath, "get_client", fail), mock.patch.object(
+            os, "stat", fail
+        ), mock.patch.object(os.path, "abspath", fail), mock.patch.object(
+            gcsio, "Path", fail
+        ):
+            paths = [
+                GCSPath("gs://bucket/dir/book.XLSX"),
+                GCSPath("gs://bucket", "dir", "book.XLSX", crc32c="crc"),
+                GCSPath("dir", "book.XLSX"),
+            ]
+        fail.assert_not_called()
+        for path in paths:
+            self.assertEqual(lazy_attributes(path), [])
+
+        # Each attribute is computed on first use, parsing only as needed
+        path = paths[0]
+        self.assertEqual(path.name, "book.XLSX")
+        self.assertEqual(lazy_attributes(path), ["bucket_name", "path", "name"])
+        self.assertEqual(path.suffix, ".XLSX")
+        self.assertEqual(paths[1].bucket_name, "bucket")
+        self.assertEqual(paths[1].path, "dir/book.XLSX")
+        self.assertEqual(paths[1].crc32c, "crc")
+        self.assertNotIn("bucket", lazy_attributes(paths[1]))
+        self.assertEqual(paths[2].path, os.path.abspath("dir/book.XLSX"))
+        self.assertIsNone(paths[2].bucket_name)
+
+    def test_pickle(self):
+        for path in [
+            GCSPath("gs://bucket/dir/a.txt", crc32c="crc"),
+            GCSPath("gs://bucket", "dir", "a.txt"),
+            GCSPath("/tmp/dir", "a.txt"),
+        ]:
+            with self.subTest(path=str(path)):
+                self.assertIsNotNone(path.bucket if path.bucket_name else path.path)
+                copy = pickle.loads(pickle.dumps(path))
+
+                # As its path, without the lazy attributes (or bucket handle)
+                self.assertEqual(lazy_attributes(copy), [])
+                self.assertEqual(copy.preset_crc32c, path.preset_crc32c)
+                self.assertEqual(str(copy), str(path))
+                self.assertEqual(copy.name, "a.txt")
+                if path.bucket_name:
+                    self.assertIs(copy.bucket, path.bucket)
+
+
+class TestRunBatched(unittest.TestCase):
+    """Runs batched operations against a storage client, with mocked responses"""
+
+    def setUp(self):
+        client = storage.Client(project="project", credentials=AnonymousCredentials())
+        GCSPath.use_client(client)
+        self.addCleanup(GCSPath.use_client, None)
+
+    @staticmethod
+    def make_response(status_code: int) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = b"{}"  # pylint: disable=protected-access
+        response.request = requests.Request("DELETE", "https://storage").prepare()
+        return response
+
+    def test_delete_many(self):
+        paths = [GCSPath(f"gs://bucket/obj-{i}") for i in range(3)]
+        responses = [self.make_response(code) for code in (204, 404, 204)]
+        with mock.patch.object(Batch, "finish", return_value=responses) as finish:
+            result = delete_many(paths)
+        finish.assert_called_once_with(raise_exception=False)
+
+        self.assertEqual(result.succeeded, [paths[0], paths[2]])
+        self.assertEqual(list(result.failed), [paths[1]])
+
+
+class SlowCredentials(Credentials):
+    """Credentials without a token, slow to refresh"""
+
+    def __init__(self):
+        super().__init__()
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        time.sleep(0.1)
+        self.token = "token"
+
+
+class TestStorageClient(unittest.TestCase):
+    """Creates the shared storage client, without connecting"""
+
+    def setUp(self):
+        self.credentials: Credentials = AnonymousCredentials()
+        default = mock.patch.object(
+            gcsio.google.auth,
+            "default",
+            side_effect=lambda scopes: (self.credentials, "project"),
+        )
+        default.start()
+        self.addCleanup(default.stop)
+
+    def test_pool(self):
+        # pylint: disable=protected-access
+        client = create_storage_client(max_connections=7)
+        adapter = client._http.get_adapter("https://storage.googleapis.com")
+        assert isinstance(adapter, KeepAliveHTTPAdapter)
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.poolmanager.connection_pool_kw["maxsize"], 7)
+
+        # The default socket options, with keep-alive
+        socket_options = adapter.poolmanager.connection_pool_kw["socket_options"]
+        self.assertIn((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1), socket_options)
+        for option in HTTPConnection.default_socket_options:  # pyright: ignore
+            self.assertIn(option, socket_options)
+
+    def test_refresh(self):
+        # pylint: disable=protected-access
+        # Expired credentials are refreshed once, however many threads use them
+        self.credentials = SlowCredentials()
+        session = create_storage_client()._http
+        with mock.patch.object(requests.Session, "request") as request:
+            threads = [
+                threading.Thread(target=session.request, args=("GET", "https://x"))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.credentials.refreshes, 1)
+        self.assertEqual(request.call_count, 8)
+
+    def test_buckets(self):
+        client = MemoryClient()
+        GCSPath.use_client(client)
+        self.addCleanup(GCSPath.use_client, None)
+
+        # Bucket handles are shared between paths, until the client changes
+        bucket = GCSPath("gs://bucket/a.txt").bucket
+        self.assertIs(GCSPath("gs://bucket/b/c.txt").bucket, bucket)
+        self.assertIs(GCSPath.open_bucket("bucket"), bucket)
+        self.assertIsNot(GCSPath("gs://other/a.txt").bucket, bucket)
+        GCSPath.use_client(MemoryClient())
+        self.assertIsNot(GCSPath("gs://bucket/a.txt").bucket, bucket)
@@ -0,0 +1,134 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from processors.base import test_gcsio
+from processors.base.gcsio import GCSPath, copy_many, delete_many, metadata_cache
+from processors.base.memory_storage import MemoryBlob, MemoryClient, compute_crc32c
+
+
+class TestGCSIOInMemory(test_gcsio.TestGCSIO):
+    """Runs the GCSPath tests against the in-memory backend"""
+
+    def setUp(self):
+        self.client = MemoryClient()
+        GCSPath.use_client(self.client)
+        env = mock.patch.dict(os.environ, {"GCS_TMP_PREFIX": "gs://memory/tmp"})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(GCSPath.use_client, None)
+
+    def test_list(self):
+        names = [f"gs://memory/list/obj-{i:04}" for i in range(25)]
+        for name in reversed(names):
+            GCSPath(name).write_text(name)
+
+        pages = list(self.client.bucket("memory").list_blobs("list/", 10).pages)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([str(x) for x in GCSPath("gs://memory/list").list()], names)
+
+    def test_metadata(self):
+        obj = GCSPath("gs://memory/meta/obj.txt")
+        obj.write_text("first")
+        first = obj.metadata()
+        self.assertEqual(first.crc32c, compute_crc32c(b"first"))
+        self.assertEqual(first.content_type, "text/plain")
+
+        obj.write_text("second")
+        second = obj.metadata()
+        assert first.generation is not None and second.generation is not None
+        self.assertGreater(second.generation, first.generation)
+        self.assertEqual(second.size, len("second"))
+
+    def test_metadata_cache_size(self):
+        names = [f"gs://memory/list/obj-{i:04}" for i in range(25)]
+        for name in names:
+            GCSPath(name).write_text(name)
+        metadata_cache.clear()
+
+        # Listing keeps the metadata of the most recently listed objects
+        with mock.patch.object(metadata_cache, "max_size", 10):
+            listed = list(GCSPath("gs://memory/list").list())
+            self.assertEqual(list(metadata_cache.entries), names[-10:])
+
+            # Using an object keeps it, evicting the least recently used
+            self.assertIsNotNone(metadata_cache.get(names[15]))
+            requests = self.client.requests
+            self.assertEqual(listed[0].size, len(names[0]))
+            self.assertEqual(self.client.requests, requests + 1)
+            self.assertEqual(len(metadata_cache.entries), 10)
+            self.assertNotIn(names[16], metadata_cache.entries)
+            self.assertIn(names[15], metadata_cache.entries)
+            self.assertEqual(list(metadata_cache.entries)[-1], names[0])
+
+    def test_many(self):
+        srcs = [GCSPath(f"gs://memory/many/src-{i}") for i in range(5)]
+        for src in srcs:
+            src.write_text(str(src))
+
+        pairs = [(src, GCSPath(str(src).replace("src-", "dst-"))) for src in srcs]
+        result = copy_many(pairs + [(GCSPath("gs://memory/missing"), srcs[0])])
+        self.assertEqual(result.succeeded, srcs)
+        self.assertEqual(list(result.failed), ["gs://memory/missing"])
+
+        result = delete_many(dst for _, dst in pairs)
+        self.assertEqual(len(result.succeeded), len(pairs))
+        self.assertFalse(any(dst.exists() for _, dst in pairs))
+
+    def test_download_to_filename(self):
+        obj = GCSPath("gs://memory/download/obj.txt")
+        obj.write_text("data")
+        metadata_cache.clear()
+
+        # Downloaded without first reloading the object for its size
+        start = self.client.requests
+        with TemporaryDirectory() as d:
+            filename = os.path.join(d, "obj.txt")
+            GCSPath(str(obj)).download_to_filename(filename)
+            with open(filename, "rt") as r:
+                self.assertEqual(r.read(), "data")
+        self.assertEqual(self.client.requests - start, 1)
+
+    def test_read_as_stream_ranges(self):
+        obj = GCSPath("gs://memory/stream/obj.bin")
+        data = bytes(range(256)) * 4
+        obj.write_bytes(data)
+
+        # Read as ranged downloads of the chunk size, buffered ahead
+        with mock.patch.object(
+            MemoryBlob,
+            "download_as_bytes",
+            autospec=True,
+            side_effect=MemoryBlob.download_as_bytes,
+        ) as download:
+            with GCSPath(str(obj)).read_as_stream(chunk_size=100) as r:
+                self.assertEqual(r.read(10), data[:10])
+                self.assertEqual(r.read(80), data[10:90])
+                self.assertEqual(r.seek(500), 500)
+                self.assertEqual(r.read(10), data[500:510])
+                self.assertEqual(r.seek(-24, 2), 1000)
+                self.assertEqual(r.read(), data[1000:])
+                self.assertEqual(r.seek(0), 0)
+                self.assertEqual(r.read(5), data[:5])
+                self.assertEqual(r.seek(2000), len(data))
+                self.assertEqual(r.read(5), b"")
+
+        ranges = [(c.kwargs["start"], c.kwargs["end"]) for c in download.call_args_list]
+        self.assertEqual([start for start, _ in ranges], [0, 500, 1000, 0, 1024])
+        self.assertTrue(all(end - start == 100 for start, end in ranges if end))
+        self.assertIsNone(ranges[2][1])
@@ -0,0 +1,82 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+from google.cloud.bigquery_storage_v1 import types
+from google.protobuf import descriptor_pb2
+from processors.base.proto_encoder import get_encoder
+from processors.base.result_writer import DocumentMetadata
+
+
+def proto_data_per_row(rows: list, with_schema: bool = True):
+    """Encode the rows one at a time through proto-plus (as previously)"""
+    proto_data = types.AppendRowsRequest.ProtoData()
+    if with_schema:
+        proto_descriptor = descriptor_pb2.DescriptorProto()
+        type(rows[0]).pb().DESCRIPTOR.CopyToProto(proto_descriptor)
+        proto_data.writer_schema = types.ProtoSchema(proto_descriptor=proto_descriptor)
+
+    proto_rows = types.ProtoRows()
+    for row in rows:
+        proto_rows.serialized_rows.append(type(row).serialize(row))
+    proto_data.rows = proto_rows
+    return proto_data
+
+
+class TestProtoRowEncoder(unittest.TestCase):
+    """Encodes rows as the per-row proto-plus encoding"""
+
+    def setUp(self):
+        self.rows = [
+            DocumentMetadata(
+                id=f"id-{i}",
+                jsonData='{"key": "välue ✓"}' * i,
+                content=DocumentMetadata.Content(
+                    mimeType="text/plain", uri=f"gs://bucket/obj-{i}.txt"
+                ),
+            )
+            for i in range(5)
+        ] + [DocumentMetadata(), DocumentMetadata(id="no content")]
+
+    def test_serialize_rows(self):
+        encoder = get_encoder(DocumentMetadata)
+        self.assertEqual(
+            encoder.serialize_rows(self.rows),
+            [DocumentMetadata.serialize(row) for row in self.rows],
+        )
+
+    def test_writer_schema(self):
+        encoder = get_encoder(DocumentMetadata)
+        expected = proto_data_per_row(self.rows)
+        self.assertEqual(encoder.proto_schema, expected.writer_schema)
+
+        # Cached, and the same however many times it is applied
+        self.assertIs(encoder.proto_schema, get_encoder(DocumentMetadata).proto_schema)
+        for _ in range(2):
+            proto_data = encoder.get_proto_data(encoder.serialize_rows(self.rows))
+            self.assertEqual(proto_data, expected)
+            self.assertEqual(
+                types.AppendRowsRequest.ProtoData.serialize(proto_data),
+                types.AppendRowsRequest.ProtoData.serialize(expected),
+            )
+
+    def test_without_schema(self):
+        encoder = get_encoder(DocumentMetadata)
+        proto_data = encoder.get_proto_data(
+            encoder.serialize_rows(self.rows), with_schema=False
+        )
+        self.assertEqual(proto_data, proto_data_per_row(self.rows, with_schema=False))
+        self.assertFalse(proto_data.writer_schema)
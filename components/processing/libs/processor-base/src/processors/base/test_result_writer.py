@@ -0,0 +1,221 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from google.api_core import exceptions
+from google.cloud.bigquery_storage_v1 import types
+from processors.base import result_writer
+from processors.base.proto_encoder import get_encoder
+from processors.base.result_writer import (
+    ROW_OVERHEAD_BYTES,
+    BigQueryWriter,
+    DocumentMetadata,
+)
+
+
+class FakeAppendRowsStream:
+    """Fake append stream, answering each request with the next error (if any)"""
+
+    def __init__(self, test: "TestBigQueryWriter", client, template):
+        self.test = test
+        self.template = template
+        self.callbacks: list = []
+        self.closed = False
+        test.streams.append(self)
+
+    def add_close_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def send(self, request: types.AppendRowsRequest) -> Future:
+        future: Future = Future()
+        error = self.test.errors.pop(0) if self.test.errors else None
+        if error is None:
+            self.test.sent.append(request)
+            future.set_result(types.AppendRowsResponse())
+            return future
+
+        # The stream closes on its own thread, while the writer waits
+        thread = threading.Thread(target=self.close, args=(error,))
+        self.test.close_threads.append(thread)
+        thread.start()
+        thread.join(timeout=5)
+        future.set_exception(error)
+        return future
+
+    def close(self, reason=None):
+        if not self.closed:
+            self.closed = True
+            for callback in self.callbacks:
+                callback(self, reason)
+
+
+class TestBigQueryWriter(unittest.TestCase):
+    """Runs BigQueryWriter against a mocked write client"""
+
+    def setUp(self):
+        self.streams: list[FakeAppendRowsStream] = []
+        self.sent: list[types.AppendRowsRequest] = []
+        self.errors: list[Exception] = []
+        self.close_threads: list[threading.Thread] = []
+
+        client = mock.patch.object(
+            result_writer.bigquery_storage_v1, "BigQueryWriteClient"
+        )
+        self.client = client.start().return_value
+        self.addCleanup(client.stop)
+        self.client.write_stream_path.return_value = "table/streams/_default"
+        self.client.table_path.return_value = "table"
+        self.client.create_write_stream.return_value = types.WriteStream(
+            name="table/streams/stream"
+        )
+        self.client.batch_commit_write_streams.return_value = (
+            types.BatchCommitWriteStreamsResponse()
+        )
+
+        stream = mock.patch.object(
+            result_writer.writer,
+            "AppendRowsStream",
+            side_effect=lambda client, template: FakeAppendRowsStream(
+                self, client, template
+            ),
+        )
+        stream.start()
+        self.addCleanup(stream.stop)
+
+    @staticmethod
+    def make_rows(count: int, start: int = 0) -> list[DocumentMetadata]:
+        return [
+            DocumentMetadata(
+                id=f"id-{i}",
+                jsonData="{}",
+                content=DocumentMetadata.Content(
+                    mimeType="text/plain", uri=f"gs://bucket/obj-{i}.txt"
+                ),
+            )
+            for i in range(start, start + count)
+        ]
+
+    def sent_rows(self) -> list[int]:
+        return [len(req.proto_rows.rows.serialized_rows) for req in self.sent]
+
+    def test_batches_rows(self):
+        writer = BigQueryWriter("project.dataset.table", max_rows=3)
+        writer.write_results(self.make_rows(2))
+        self.assertEqual(self.sent_rows(), [])
+
+        writer.write_results(self.make_rows(5, start=2))
+        self.assertEqual(self.sent_rows(), [7])
+
+        writer.write_results(self.make_rows(1, start=7))
+        writer.close()
+        self.assertEqual(self.sent_rows(), [7, 1])
+        self.assertEqual(writer.stats.rows_sent, 8)
+        self.assertEqual(len(self.streams), 1)
+
+        # The schema is only in the template of the stream, not each request
+        self.assertTrue(self.streams[0].template.proto_rows.writer_schema)
+        self.assertFalse(self.sent[0].proto_rows.writer_schema)
+
+    def test_batches_bytes(self):
+        encoder = get_encoder(DocumentMetadata)
+        row_bytes = len(encoder.serialize_rows(self.make_rows(1))[0])
+        writer = BigQueryWriter(
+            "project.dataset.table",
+            max_rows=100,
+            max_bytes=3 * (row_bytes + ROW_OVERHEAD_BYTES),
+        )
+        writer.write_results(self.make_rows(10))
+        writer.close()
+        self.assertEqual(sum(self.sent_rows()), 10)
+        self.assertTrue(all(rows <= 3 for rows in self.sent_rows()))
+
+    def test_pending_stream(self):
+        writer = BigQueryWriter(
+            "project.dataset.table", max_rows=2, stream_type="pending"
+        )
+        for i in range(5):
+            writer.write_results(self.make_rows(1, start=i))
+        writer.close()
+
+        self.assertEqual([req.offset for req in self.sent], [0, 2, 4])
+        self.client.finalize_write_stream.assert_called_once_with(
+            name="table/streams/stream"
+        )
+        self.client.batch_commit_write_streams.assert_called_once_with(
+            request=types.BatchCommitWriteStreamsRequest(
+                parent="table", write_streams=["table/streams/stream"]
+            )
+        )
+
+    def test_commit(self):
+        self.client.create_write_stream.side_effect = [
+            types.WriteStream(name=f"table/streams/stream-{i}") for i in range(3)
+        ]
+        writer = BigQueryWriter("project.dataset.table", stream_type="pending")
+        writer.write_results(self.make_rows(2))
+        writer.commit()
+        self.assertEqual(self.sent_rows(), [2])
+        self.client.batch_commit_write_streams.assert_called_once_with(
+            request=types.BatchCommitWriteStreamsRequest(
+                parent="table", write_streams=["table/streams/stream-0"]
+            )
+        )
+
+        # The rows after are appended to a new stream, from its first offset
+        writer.write_results(self.make_rows(3, start=2))
+        writer.close()
+        self.assertEqual(self.sent_rows(), [2, 3])
+        self.assertEqual([req.offset for req in self.sent], [0, 0])
+        self.assertEqual(
+            [stream.template.write_stream for stream in self.streams],
+            ["table/streams/stream-0", "table/streams/stream-1"],
+        )
+        self.assertEqual(self.client.batch_commit_write_streams.call_count, 2)
+
+    def test_pending_stream_commit_errors(self):
+        self.client.batch_commit_write_streams.return_value = (
+            types.BatchCommitWriteStreamsResponse(
+                stream_errors=[types.StorageError(error_message="not finalized")]
+            )
+        )
+        writer = BigQueryWriter("project.dataset.table", stream_type="pending")
+        writer.write_results(self.make_rows(1))
+        with self.assertRaisesRegex(RuntimeError, "not finalized"):
+            writer.close()
+
+    def test_retries(self):
+        writer = BigQueryWriter(
+            "project.dataset.table",
+            max_rows=1,
+            max_in_flight=2,
+            stream_type="committed",
+            retry_delay=0,
+        )
+        self.errors = [exceptions.ServiceUnavailable("unavailable")]
+        for i in range(3):
+            writer.write_results(self.make_rows(1, start=i))
+        writer.close()
+
+        # Requests are sent on a new stream once closed, and the failed request
+        # re-sent with those after it
+        self.assertEqual([req.offset for req in self.sent], [1, 0, 1, 2])
+        self.assertEqual([stream.closed for stream in self.streams], [True] * 3)
+        self.assertFalse(any(thread.is_alive() for thread in self.close_threads))
+        self.assertEqual(writer.stats.retries, 1)
+        self.assertEqual(writer.stats.rows_sent, 3)
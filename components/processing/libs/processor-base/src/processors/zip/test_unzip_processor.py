@@ -0,0 +1,120 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import io
+import os
+import unittest
+import zipfile
+from unittest import mock
+
+from processors.base.gcsio import GCSPath
+from processors.base.memory_storage import MemoryClient
+from processors.zip import unzip_processor as unzip
+from processors.zip.unzip_processor import member_name, unzip_processor
+
+
+def zip_bytes(members: dict, compression=zipfile.ZIP_STORED) -> bytes:
+    """Create a zip archive of the named members"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=compression) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return buffer.getvalue()
+
+
+class TestUnzipProcessor(unittest.TestCase):
+    """Streams archives to the in-memory backend"""
+
+    def setUp(self):
+        GCSPath.use_client(MemoryClient())
+        self.addCleanup(GCSPath.use_client, None)
+        self.source = GCSPath("gs://memory/process/archive.zip")
+        self.output = GCSPath("gs://memory/process/archive.zip.out")
+
+    def write_archive(self, members: dict, **kwargs):
+        self.source.write_bytes(zip_bytes(members, **kwargs))
+
+    def read_outputs(self) -> dict:
+        prefix = self.output.path + "/"
+        return {
+            path.path[len(prefix) :]: path.read_bytes()
+            for path in GCSPath(str(self.output) + "/").list()
+        }
+
+    def test_member_name(self):
+        for filename, expected in [
+            ("a/b.txt", "a/b.txt"),
+            ("../../a.txt", "a.txt"),
+            ("/etc/a.txt", "etc/a.txt"),
+            ("a/./../b.txt", "a/b.txt"),
+            ("a\\b.txt", "a/b.txt"),
+            ("..", ""),
+        ]:
+            with self.subTest(filename=filename):
+                self.assertEqual(member_name(zipfile.ZipInfo(filename)), expected)
+
+    def test_extract(self):
+        members = {f"dir/{i}.txt": f"member {i}".encode() * i for i in range(20)}
+        members["../outside.txt"] = b"outside"
+        self.write_archive(members)
+
+        # Members are split over the workers, each streaming in archive order
+        for workers in (1, 3):
+            with self.subTest(workers=workers), mock.patch.object(
+                unzip, "UNZIP_WORKERS", workers
+            ):
+                self.assertEqual(unzip_processor(self.source, self.output), {})
+                expected = dict(members)
+                expected["outside.txt"] = expected.pop("../outside.txt")
+                self.assertEqual(self.read_outputs(), expected)
+
+    def test_suffixes(self):
+        self.write_archive({"a.txt": b"a", "b.bin": b"b", "c/d.msg": b"d"})
+        unzip_processor(self.source, self.output, suffixes=[".txt", ".msg"])
+        self.assertEqual(self.read_outputs(), {"a.txt": b"a", "c/d.msg": b"d"})
+
+    def test_limits(self):
+        self.write_archive({"a.txt": b"a" * 1000, "b.txt": b"b" * 1000})
+        with mock.patch.object(unzip, "UNZIP_MAX_TOTAL_SIZE", 1999):
+            with self.assertRaisesRegex(ValueError, "over the limit of 1999 bytes"):
+                unzip_processor(self.source, self.output)
+
+        # Highly compressed members (as in zip bombs) are over the ratio
+        self.write_archive({"a.txt": b"a" * 100_000}, compression=zipfile.ZIP_DEFLATED)
+        with self.assertRaisesRegex(ValueError, "over the limit of 100 times"):
+            unzip_processor(self.source, self.output)
+        self.assertEqual(self.read_outputs(), {})
+
+    def write_mixed_archive(self, stored: dict, deflated: dict):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as z:
+            for name, data in stored.items():
+                z.writestr(name, data)
+            for name, data in deflated.items():
+                z.writestr(name, data, zipfile.ZIP_DEFLATED)
+        self.source.write_bytes(buffer.getvalue())
+
+    def test_member_ratio(self):
+        # One highly compressed member in a large, mostly stored archive
+        stored = {f"stored-{i}.bin": os.urandom(100_000) for i in range(30)}
+        self.write_mixed_archive(stored, {"bomb.txt": b"\0" * 2_000_000})
+        with self.assertRaisesRegex(ValueError, "member bomb.txt expands"):
+            unzip_processor(self.source, self.output)
+        self.assertEqual(self.read_outputs(), {})
+
+        # Small members are not held to the ratio
+        self.write_mixed_archive(stored, {"small.txt": b"\0" * 100_000})
+        unzip_processor(self.source, self.output)
+        self.assertEqual(self.read_outputs()["small.txt"], b"\0" * 100_000)
@@ -13,8 +13,13 @@
 # limitations under the License.
 
 import logging
+import os
+import shutil
+import time
 import zipfile
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+from typing import Collection, Dict, Optional
 
 from processors.base.gcsio import GCSPath
 
@@ -23,16 +28,125 @@ from processors.base.gcsio import GCSPath
 
 logger = logging.getLogger(__name__)
 
+# Limits on the contents of an archive, against zip bombs
+UNZIP_MAX_RATIO = float(os.environ.get("UNZIP_MAX_RATIO", "100"))
+UNZIP_MAX_TOTAL_SIZE = int(
+    os.environ.get("UNZIP_MAX_TOTAL_SIZE", str(10 * 1024 * 1024 * 1024))
+)
+# Members expanding to less are not held to the ratio (small files compress well)
+UNZIP_RATIO_MIN_SIZE = int(os.environ.get("UNZIP_RATIO_MIN_SIZE", str(1024 * 1024)))
 
-def unzip_processor(source: GCSPath, output_dir: GCSPath) -> Dict:
-    # Unzip the zip archive
+# Members extracted concurrently, each buffering up to a chunk in memory
+UNZIP_WORKERS = int(os.environ.get("UNZIP_WORKERS", "8"))
+UNZIP_CHUNK_SIZE = int(os.environ.get("UNZIP_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+
+def member_name(member: zipfile.ZipInfo) -> str:
+    """Get the output name of a member, without any absolute or parent parts"""
+    parts = PurePosixPath(member.filename.replace("\\", "/")).parts
+    return "/".join(part for part in parts if part not in ("/", ".", ".."))
+
+
+def check_limits(source: GCSPath, members: list[zipfile.ZipInfo]):
+    """Raise if the members expand beyond the limits
+
+    The sizes are those declared by the archive, extraction stops reading each
+    member at its declared size.
+    """
+    total = sum(member.file_size for member in members)
+    if total > UNZIP_MAX_TOTAL_SIZE:
+        raise ValueError(
+            f"{source} expands to {total} bytes, over the limit of "
+            f"{UNZIP_MAX_TOTAL_SIZE} bytes"
+        )
+
+    compressed = sum(member.compress_size for member in members)
+    if total > UNZIP_MAX_RATIO * max(compressed, 1):
+        raise ValueError(
+            f"{source} expands {total / max(compressed, 1):.0f} times, over the "
+            f"limit of {UNZIP_MAX_RATIO:.0f} times"
+        )
+
+    # Each member too, as one bomb can hide among large stored members
+    for member in members:
+        ratio = member.file_size / max(member.compress_size, 1)
+        if member.file_size >= UNZIP_RATIO_MIN_SIZE and ratio > UNZIP_MAX_RATIO:
+            raise ValueError(
+                f"{source} member {member.filename} expands {ratio:.0f} times, "
+                f"over the limit of {UNZIP_MAX_RATIO:.0f} times"
+            )
+
+
+def split_members(
+    members: list[zipfile.ZipInfo], count: int
+) -> list[list[zipfile.ZipInfo]]:
+    """Split the members into contiguous groups of similar compressed size"""
+    target = max(sum(member.compress_size for member in members) / count, 1)
+    groups: list[list[zipfile.ZipInfo]] = [[] for _ in range(count)]
+    offset = 0
+    for member in members:
+        groups[min(int(offset / target), count - 1)].append(member)
+        offset += member.compress_size
+    return [group for group in groups if group]
+
+
+def extract_members(
+    source: GCSPath, output_dir: GCSPath, members: list[zipfile.ZipInfo]
+):
+    """Stream the members from the archive to the output folder"""
+    # Each group reads the archive with its own stream, in archive order
+    with source.read_as_stream() as r, zipfile.ZipFile(r) as z:
+        for member in members:
+            output = GCSPath(output_dir, member_name(member))
+            with (
+                z.open(member) as reader,
+                output.open("wb", chunk_size=UNZIP_CHUNK_SIZE) as writer,
+            ):
+                shutil.copyfileobj(reader, writer, UNZIP_CHUNK_SIZE)
+
+
+def unzip_processor(
+    source: GCSPath,
+    output_dir: GCSPath,
+    suffixes: Optional[Collection[str]] = None,
+) -> Dict:
+    """Extract the members of the zip archive to the output folder
+
+    Members are streamed to the output folder concurrently, rather than
+    extracted locally first. Only members with the suffixes (if any) are
+    extracted.
+    """
     logger.info(f"Unzipping {str(source)}")
-    with (
-        source.read_as_file() as r,
-        zipfile.ZipFile(r) as z,
-        output_dir.write_folder() as output,
-    ):
-        z.extractall(output)
+    start = time.monotonic()
+
+    with source.read_as_stream() as r, zipfile.ZipFile(r) as z:
+        members = [
+            member
+            for member in z.infolist()
+            if not member.is_dir()
+            and member_name(member)
+            and (suffixes is None or PurePosixPath(member.filename).suffix in suffixes)
+        ]
+        skipped = len(z.infolist()) - len(members)
+
+    check_limits(source, members)
+
+    groups = split_members(members, max(UNZIP_WORKERS, 1))
+    with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as executor:
+        list(
+            executor.map(
+                lambda group: extract_members(source, output_dir, group), groups
+            )
+        )
+
+    logger.info(
+        "Extracted %d members (%d bytes, skipped %d) of %s in %.2fs",
+        len(members),
+        sum(member.file_size for member in members),
+        skipped,
+        str(source),
+        time.monotonic() - start,
+    )
 
     # Add it in as a rendered type
     return dict()
@@ -0,0 +1,85 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Offline throughput benchmark of process_all_objects
+
+Runs the pipeline over generated messages held in the in-memory storage
+backend, with a fixed latency per request, e.g.
+
+    python benchmarks/bench_process_all_objects.py --objects 200 --workers 1 8
+"""
+
+import argparse
+import time
+
+from faker import Faker
+from processors.base.gcsio import GCSPath
+from processors.base.memory_storage import MemoryClient
+from processors.msg.main_processor import process_all_objects
+from processors.msg.msg_generator import MSGGenerator
+
+SUPPORTED_FILES = {
+    ".txt": "txt-processor",
+    ".xlsx": "xlsx-processor",
+    ".msg": "msg-processor",
+    ".zip": "zip-processor",
+}
+
+
+def make_messages(count: int) -> list[bytes]:
+    """Generate the messages (deterministically)"""
+    Faker.seed(0)
+    generator = MSGGenerator()
+    return [generator.to_bytes() for _ in range(count)]
+
+
+def run(messages: list[bytes], latency: float, workers: int):
+    """Process the messages, returning the elapsed time and request count"""
+    client = MemoryClient(latency=latency)
+    GCSPath.use_client(client)
+    try:
+        for i, data in enumerate(messages):
+            GCSPath(f"gs://bench/process/message-{i:06}.msg").write_bytes(data)
+
+        start_requests = client.requests
+        start = time.perf_counter()
+        process_all_objects(
+            GCSPath("gs://bench/process"),
+            GCSPath("gs://bench/reject"),
+            SUPPORTED_FILES,
+            workers=workers,
+        )
+        return time.perf_counter() - start, client.requests - start_requests
+    finally:
+        GCSPath.use_client(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    messages = make_messages(args.objects)
+    for workers in args.workers:
+        elapsed, requests = run(messages, args.latency, workers)
+        print(
+            f"{args.objects:>6} objects {workers:>3} workers: "
+            f"{args.objects / elapsed:>8.1f} objects/sec, "
+            f"{requests / args.objects:>6.1f} requests/object"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Checkpoint for resuming the processing of a folder after a failure"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict
+
+from processors.base.gcsio import GCSPath
+
+logger = logging.getLogger(__name__)
+
+# Seconds between writing the completed objects to the checkpoint
+CHECKPOINT_INTERVAL = float(os.environ.get("CHECKPOINT_INTERVAL", "30"))
+
+
+class Checkpoint:
+    """Checkpoint - manifest of completed objects and their emitted rows
+
+    Completed objects are buffered and written as JSONL parts under the
+    checkpoint folder (objects are immutable, so each flush writes a new part),
+    one line per object:
+
+        {"uri": "gs://...", "rows": ["id-...", ...]}
+
+    Objects must only be flushed once their rows are committed, and rows only
+    committed as their objects are flushed (e.g. appended to a pending stream
+    committed with each flush), so a resumed run neither skips nor duplicates
+    rows.
+    """
+
+    def __init__(self, checkpoint_dir: GCSPath, interval: float = CHECKPOINT_INTERVAL):
+        self.checkpoint_dir = checkpoint_dir
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.completed: Dict[str, list[str]] = {}
+        self.pending: list[str] = []
+        self.flushed_at = time.monotonic()
+
+        # Listed as a folder, not a prefix also matching siblings (xls, xlsx)
+        for part in GCSPath(str(checkpoint_dir).rstrip("/") + "/").list():
+            if part.suffix != ".jsonl":
+                continue
+            for line in part.read_text().splitlines():
+                if line:
+                    entry = json.loads(line)
+                    self.completed[entry["uri"]] = entry["rows"]
+
+        # Cloud Run sets the attempt, the previous may have left partial outputs
+        attempt = int(os.environ.get("CLOUD_RUN_TASK_ATTEMPT", "0"))
+        self.resuming = attempt > 0 or bool(self.completed)
+        if self.resuming:
+            logger.info(
+                "Resuming attempt %d with %d completed objects from %s",
+                attempt,
+                len(self.completed),
+                str(checkpoint_dir),
+            )
+
+    def is_complete(self, source: GCSPath) -> bool:
+        """Return if the object was completed by a previous attempt"""
+        return str(source) in self.completed
+
+    def record(self, source: GCSPath, rows: list[str]):
+        """Record that the object is complete, with the ids of its rows"""
+        with self.lock:
+            self.completed[str(source)] = rows
+            self.pending.append(json.dumps({"uri": str(source), "rows": rows}))
+
+    def is_due(self) -> bool:
+        """Return if the checkpoint should be flushed"""
+        return bool(self.pending) and (
+            time.monotonic() - self.flushed_at >= self.interval
+        )
+
+    def flush(self):
+        """Write the objects completed since the last flush as a new part"""
+        with self.lock:
+            self.flushed_at = time.monotonic()
+            if not self.pending:
+                return
+            lines, self.pending = self.pending, []
+
+        part = GCSPath(
+            self.checkpoint_dir, f"part-{time.time_ns()}-{uuid.uuid4().hex}.jsonl"
+        )
+        part.write_text("\n".join(lines) + "\n")
+        logger.info("Checkpointed %d objects to %s", len(lines), str(part))
@@ -13,19 +13,43 @@
 # limitations under the License.
 
 
+import collections
+import concurrent.futures
+import dataclasses
+import functools
 import json
 import logging
+import os
+import shutil
+import time
+import zlib
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from enum import Enum
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
 
-from processors.base.gcsio import GCSPath
+from processors.base.gcsio import GCSPath, delete_many, move_many
 from processors.base.result_writer import BigQueryWriter, DocumentMetadata
+from processors.msg.checkpoint import Checkpoint
 from processors.msg.msg_processor import msg_processor
+from processors.msg.process_pool import ProcessPool
+from processors.msg.result_cache import ResultCache
+from processors.msg.scheduler import Scheduler
 from processors.xlsx import xlsx_processor
 from processors.zip.unzip_processor import unzip_processor
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Number of objects listed ahead of those being processed (per worker)
+LISTING_READ_AHEAD = 2
+
+# Limits on expanding an object, against archives expanding without bound
+MAX_EXPANSION_DEPTH = int(os.environ.get("MAX_EXPANSION_DEPTH", "10"))
+MAX_EXPANSION_FAN_OUT = int(os.environ.get("MAX_EXPANSION_FAN_OUT", "10000"))
+MAX_EXPANDED_BYTES = int(os.environ.get("MAX_EXPANDED_BYTES", str(10 * 1024**3)))
+
 
 class Processors(str, Enum):
     TXT = "txt-processor"
@@ -41,6 +65,100 @@ PROCESSOR_NAMES_TO_CALLABLE = {
     Processors.XLSX.value: xlsx_processor,
 }
 
+# Versions of the processors outputs, increment when changing a processor so
+# that cached results are no longer used
+PROCESSOR_VERSIONS = {
+    Processors.MSG.value: "2",
+    Processors.ZIP.value: "2",
+    Processors.XLSX.value: "6",
+}
+
+# Processors that are CPU bound (and hold the GIL), so are run
+# in the process pool when one is available
+CPU_BOUND_PROCESSORS = {
+    Processors.MSG.value,
+    Processors.XLSX.value,
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class ExpansionLimits:
+    """Limits on expanding an object
+
+    max_depth - levels of nesting expanded
+    max_fan_out - objects expanded from each object
+    max_bytes - total size of the objects expanded from a top-level object
+    """
+
+    max_depth: int = MAX_EXPANSION_DEPTH
+    max_fan_out: int = MAX_EXPANSION_FAN_OUT
+    max_bytes: int = MAX_EXPANDED_BYTES
+
+
+class InlineExecutor(Executor):
+    """Executor running each call as it is submitted"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+# Processors that only output the objects with supported suffixes
+FILTERING_PROCESSORS = {
+    Processors.MSG.value,
+    Processors.ZIP.value,
+}
+
+
+def run_processor(
+    processor_name: str, source: str, output: str, **options
+) -> Optional[Dict]:
+    """Run a named processor on the source and output paths
+
+    Paths are passed as strings so this can be called within a worker process.
+    """
+    processor = PROCESSOR_NAMES_TO_CALLABLE[processor_name]
+    return processor(GCSPath(source), GCSPath(output), **options)  # pyright: ignore
+
+
+def timed(
+    fn: Callable[[GCSPath], R], record: Callable[[GCSPath, float], None]
+) -> Callable[[GCSPath], R]:
+    """Wrap fn, recording how long each call takes"""
+
+    def timed_fn(obj: GCSPath) -> R:
+        start = time.perf_counter()
+        try:
+            return fn(obj)
+        finally:
+            record(obj, time.perf_counter() - start)
+
+    return timed_fn
+
+
+def bounded_submit(
+    executor: Executor,
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    max_pending: int,
+) -> Iterator[Tuple[T, "Future[R]"]]:
+    """Submit items to the executor, yielding (item, future) in submission order
+
+    At most max_pending items are submitted ahead of the consumer, so the
+    items iterable (such as a listing) is only read as results are consumed.
+    """
+    pending: collections.deque = collections.deque()
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= max_pending:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
 
 def process_all_objects(
     source_dir: GCSPath,
@@ -48,21 +166,149 @@ def process_all_objects(
     supported_files: Dict[str, str],
     write_json=True,
     write_bigquery: str = "",
+    workers: int = 1,
+    process_workers: int = 0,
+    bigquery_stream: str = "default",
+    result_cache: str = "",
+    checkpoint_dir: str = "",
+    shard_index: int = 0,
+    shard_count: int = 1,
+    schedule: str = "listing",
+    expand_workers: Optional[int] = None,
+    limits: ExpansionLimits = ExpansionLimits(),
 ):
-    all_objects = list(source_dir.list())
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index} of {shard_count}")
+    if shard_count > 1:
+        logger.info(f"Processing shard {shard_index} of {shard_count}")
 
     writer = None
     if write_bigquery != "":
-        writer = BigQueryWriter(write_bigquery)
+        # Rows are committed with each checkpoint, so a resumed run neither
+        # skips nor duplicates them, which needs them held in a pending stream
+        if checkpoint_dir and bigquery_stream != "pending":
+            logger.info("Checkpointing, so writing to BigQuery with pending streams")
+            bigquery_stream = "pending"
+        writer = BigQueryWriter(write_bigquery, stream_type=bigquery_stream)
+
+    # Optional checkpoint of the completed objects, to resume after a failure
+    checkpoint = None
+    if checkpoint_dir:
+        if shard_count > 1:
+            checkpoint_dir += f"/shard-{shard_index}-of-{shard_count}"
+        checkpoint = Checkpoint(GCSPath(checkpoint_dir))
+
+    # Optional pool of processes for the CPU bound processors
+    processor_pool = None
+    if process_workers > 0:
+        processor_pool = ProcessPool(process_workers)
+
+    # Pool for the objects expanded from those being processed, separate from
+    # the workers so they are never blocked waiting on each other
+    if expand_workers is None:
+        expand_workers = workers
+    expand_pool = None
+    if expand_workers > 0:
+        expand_pool = ThreadPoolExecutor(max_workers=expand_workers)
+
+    extract = functools.partial(
+        extract_object,
+        reject_dir=reject_dir,
+        supported_files=supported_files,
+        write_json=write_json,
+        processor_pool=processor_pool,
+        result_cache=ResultCache(GCSPath(result_cache)) if result_cache else None,
+        clear_outputs=checkpoint is not None and checkpoint.resuming,
+        expand_pool=expand_pool,
+        limits=limits,
+    )
 
-    for obj in all_objects:
-        process_object(
-            obj,
-            reject_dir,
-            supported_files,
-            write_json=write_json,
-            bq_writer=writer,
-        )
+    # Outputs are processed with their source object, so are skipped if listed
+    # (e.g. left by an interrupted attempt), as are completed objects
+    objects = (
+        obj
+        for obj in source_dir.list()
+        if get_shard(obj, shard_count) == shard_index
+        and not is_output(source_dir, obj)
+        and not (checkpoint is not None and checkpoint.is_complete(obj))
+    )
+
+    workers = max(workers, 1)
+    max_pending = workers * LISTING_READ_AHEAD
+
+    # Optionally order the objects longest first, which reads the whole
+    # listing (holding it in memory) before any are processed, so is only
+    # suited to listings of a bounded size
+    scheduler = None
+    if schedule == "lpt":
+        scheduler = Scheduler(supported_files, workers)
+        objects = scheduler.order(objects)
+        max_pending = max(len(objects), 1)
+        extract = timed(extract, scheduler.record)
+    elif schedule != "listing":
+        raise ValueError(f"Unknown schedule {schedule}")
+
+    processed = 0
+    failed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Stream the objects into the workers, collecting in scheduled
+            # order so results are written deterministically
+            for obj, future in bounded_submit(
+                executor,
+                extract,
+                objects,
+                max_pending=max_pending,
+            ):
+                processed += 1
+                try:
+                    objs = future.result()
+                except Exception as e:
+                    logger.error(f"error processing {obj}: {e}")
+                    logger.exception(e)
+                    failed += 1
+                    continue
+
+                if writer:
+                    write_bigquery_results(objs, writer)
+
+                # Objects are only checkpointed once their rows are committed
+                if checkpoint is not None:
+                    checkpoint.record(obj, [metadata["id"] for metadata in objs])
+                    if checkpoint.is_due():
+                        if writer:
+                            writer.commit()
+                        checkpoint.flush()
+    finally:
+        if expand_pool:
+            expand_pool.shutdown()
+        if processor_pool:
+            processor_pool.shutdown()
+
+        # Write any buffered results, then checkpoint the objects they are of
+        if writer:
+            writer.close()
+        if checkpoint is not None:
+            checkpoint.flush()
+
+    if scheduler is not None:
+        scheduler.report()
+
+    if failed:
+        raise RuntimeError(f"Failed to process {failed} of {processed} objects")
+
+
+def get_shard(obj: GCSPath, shard_count: int) -> int:
+    """Get the shard of an object (deterministic, from its path)"""
+    if shard_count == 1:
+        return 0
+    return zlib.crc32(str(obj).encode("utf8")) % shard_count
+
+
+def is_output(source_dir: GCSPath, obj: GCSPath) -> bool:
+    """Return if the object is within the output folder of another object"""
+    relative_folders = obj.path[len(source_dir.path) :].split("/")[:-1]
+    return any(folder.endswith(".out") for folder in relative_folders)
 
 
 def move_rejected_file(source: GCSPath, reject_dir: GCSPath, error_msg: str):
@@ -73,10 +319,11 @@ def move_rejected_file(source: GCSPath, reject_dir: GCSPath, error_msg: str):
     # Ends with array of relative folders in between
     relative_folders = source.path.split("/")[2:-1]
     relative_folders_str = "/".join(relative_folders)
-    source.move(GCSPath(str(reject_dir) + f"{relative_folders_str}", source.name))
-    json_err_msg = GCSPath(
-        str(reject_dir) + f"{relative_folders_str}", source.name + ".json"
-    )
+    reject_folder = GCSPath(str(reject_dir) + f"{relative_folders_str}")
+    result = move_many([(source, GCSPath(reject_folder, source.name))])
+    for error in result.failed.values():
+        raise error
+    json_err_msg = GCSPath(reject_folder, source.name + ".json")
     json_err_msg.write_text(
         json.dumps(
             {"error_msg": error_msg},
@@ -85,6 +332,14 @@ def move_rejected_file(source: GCSPath, reject_dir: GCSPath, error_msg: str):
     )
 
 
+def delete_output(output: GCSPath):
+    """Delete an output folder, such as the partial outputs of a failure"""
+    if output.is_gcs():
+        delete_many(GCSPath(str(output) + "/").list())
+    else:
+        shutil.rmtree(output.path, ignore_errors=True)
+
+
 def reject_oversized_file(
     source: GCSPath, reject_dir: GCSPath, file_size_limit_mb: float
 ) -> bool:
@@ -98,11 +353,14 @@ def reject_oversized_file(
     return False
 
 
-def process_recursive(
+def process_single(
     source: GCSPath,
     reject_dir: GCSPath,
     supported_files: Dict[str, str],
-) -> list[dict]:
+    processor_pool: Optional[ProcessPool] = None,
+    result_cache: Optional[ResultCache] = None,
+) -> Tuple[dict, Optional[GCSPath]]:
+    """Process an object, returning its result and output folder (if expanded)"""
 
     result = {
         "objid": "",
@@ -111,12 +369,11 @@ def process_recursive(
         "metadata": {},
         "status": "UNPROCESSED",
     }
-    results = [result]
 
     if not supported_files.get(source.suffix, False):
         result["status"] = "Not indexed or expanded"
         result["metadata"]["reason"] = f"file of type {source.suffix} not " f"supported"
-        return results
+        return result, None
     processor_name = supported_files[source.suffix]
 
     if processor_name == Processors.TXT.value:
@@ -124,16 +381,16 @@ def process_recursive(
         # current file size limit of 100MB in Data Store
         if reject_oversized_file(source, reject_dir, 100):
             result["status"] = "Rejected -- over 100MB"
-            return results
+            return result, None
 
         # current file size limit of 2.5MB for TXT in Data Store
         if source.suffix == ".txt" and reject_oversized_file(source, reject_dir, 2.5):
             result["status"] = "Rejected -- over 2.5MB and text"
-            return results
+            return result, None
 
         result["objid"] = source.hash
         result["status"] = "Indexed"
-        return results
+        return result, None
 
     # the one special case is txt-processor, that will return None, but this
     # should have been handled above - beware of changes to the order of
@@ -146,21 +403,40 @@ def process_recursive(
             f"to a processor {processor_name} that "
             f"is not mapped to a callable"
         )
-        return results
+        return result, None
 
-    # Attempt to use it.
+    # Reuse the outputs of a previous run, if the object is unchanged
     output = GCSPath(str(source) + ".out")
+    version = PROCESSOR_VERSIONS.get(processor_name, "")
+    options = {}
+    if processor_name in FILTERING_PROCESSORS:
+        # The outputs depend on the suffixes, so cached outputs must match them
+        options["suffixes"] = sorted(supported_files)
+        version += ":" + ",".join(options["suffixes"])
+    if result_cache is not None:
+        metadata = result_cache.restore(source, processor_name, version, output)
+        if metadata is not None:
+            result["status"] = "Expanded"
+            result["metadata"] = metadata
+            return result, output
+
+    # Attempt to use it.
     if output.exists():
         logger.info("Output directory already exists... what is going on?")
         result["status"] = "Output directory already exists"
-        return results
+        return result, None
 
     try:
         # Generate outputs and find more metadata
-        metadata = processor(source, output)
+        if processor_pool is not None and processor_name in CPU_BOUND_PROCESSORS:
+            metadata = processor_pool.run(
+                run_processor, processor_name, str(source), str(output), **options
+            )
+        else:
+            metadata = processor(source, output, **options)
         if metadata is None:
             result["status"] = "Processor returned no data"
-            return results
+            return result, None
 
         result["status"] = "Expanded"
         result["metadata"] = metadata
@@ -169,32 +445,99 @@ def process_recursive(
         logger.error(f"error running processor: {e}")
         logger.exception(e)
 
+        # Outputs are streamed to the output folder, so remove any written
+        # before the failure (which would otherwise block a retry)
+        try:
+            delete_output(output)
+        except Exception as delete_error:
+            logger.warning(f"error deleting outputs of {source}: {delete_error}")
+
         # Move the failed to process doc to the reject folder
         move_rejected_file(source, reject_dir, f"Doc processor fail with error: {e}")
         result["status"] = f"Processor failed with error {e}"
-        return results
+        return result, None
 
-    # Return with the children
-    for child in list(output.list()):
-        results.extend(process_recursive(child, reject_dir, supported_files))
+    if result_cache is not None:
+        try:
+            result_cache.store(source, processor_name, version, output, metadata)
+        except Exception as e:
+            logger.warning(f"error caching outputs of {source}: {e}")
 
-    return results
+    # Return with the output to expand
+    return result, output
 
 
-def process_object(
+def process_recursive(
     source: GCSPath,
     reject_dir: GCSPath,
     supported_files: Dict[str, str],
-    write_json=True,
-    bq_writer: Optional[BigQueryWriter] = None,
-):
+    processor_pool: Optional[ProcessPool] = None,
+    result_cache: Optional[ResultCache] = None,
+    expand_pool: Optional[Executor] = None,
+    limits: ExpansionLimits = ExpansionLimits(),
+) -> list[dict]:
+    """Process an object and the objects expanded from it (and so on)
+
+    The object itself is processed on the calling thread, and the objects
+    expanded from it are queued and processed concurrently in the expand_pool
+    (if any), within the limits. The results are in depth-first order.
+    """
+    process = functools.partial(
+        process_single,
+        reject_dir=reject_dir,
+        supported_files=supported_files,
+        processor_pool=processor_pool,
+        result_cache=result_cache,
+    )
+    pool = expand_pool or InlineExecutor()
+
+    # Results are keyed by their position in the tree, e.g. (0, 2) for the
+    # third child of the first child, so sort into depth-first order
+    results: Dict[Tuple[int, ...], dict] = {}
+    processed: Future = Future()
+    processed.set_result(process(source))
+    queued: Dict[Future, Tuple[Tuple[int, ...], int]] = {processed: ((), 0)}
+    expanded_bytes = 0
+    while queued:
+        done, _ = concurrent.futures.wait(
+            queued, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            key, depth = queued.pop(future)
+            result, output = future.result()
+            results[key] = result
+            if output is None:
+                continue
+
+            children = list(GCSPath(str(output) + "/").list())
+            if depth >= limits.max_depth:
+                result["status"] = (
+                    f"Expanded -- {len(children)} objects not processed, "
+                    f"over the depth limit of {limits.max_depth}"
+                )
+                continue
+
+            skipped = max(len(children) - limits.max_fan_out, 0)
+            for i, child in enumerate(children[: limits.max_fan_out]):
+                if expanded_bytes + child.size > limits.max_bytes:
+                    skipped = len(children) - i
+                    break
+                expanded_bytes += child.size
+                queued[pool.submit(process, child)] = (key + (i,), depth + 1)
+
+            if skipped:
+                logger.warning(f"Not processing {skipped} objects within {output}")
+                result["status"] = (
+                    f"Expanded -- {skipped} of {len(children)} objects not "
+                    f"processed, over the limit of {limits.max_fan_out} objects "
+                    f"or {limits.max_bytes} bytes"
+                )
 
-    logger.info(f"Processing {source}...")
+    return [results[key] for key in sorted(results)]
 
-    # Extract everything
-    objs = process_recursive(source, reject_dir, supported_files)
 
-    logger.debug(f"Objects: {objs}")
+def get_object_metadata(objs: list[dict]) -> list[dict]:
+    """Get the metadata of the indexed objects from the extracted objects"""
 
     # Create a object map with a subset of the data
     obj_keys = ["uri", "objid", "status", "mimetype"]
@@ -203,50 +546,106 @@ def process_object(
         obj_map.append(dict(((k, obj[k]) for k in obj_keys)))
     logger.debug(f"Object map: {obj_map}")
 
+    obj_metadata = []
     for obj in objs:
 
         # Skip if no "objid" (not to be indexed)
         if not obj["objid"]:
             continue
 
-        # Object metadata
-        obj_metadata = {
-            # Map of all related objects
-            "objs": obj_map,
-            # Metadata for this one object
-            "metadata": obj["metadata"],
-            # Status of processing
-            "status": obj["status"],
-        }
-
-        # Write to BigQuery if necessary
-        if bq_writer:
-            bq_writer.write_results(
-                [
-                    DocumentMetadata(
-                        id=obj["objid"],
-                        jsonData=json.dumps(obj_metadata, default=str),
-                        content=DocumentMetadata.Content(
-                            mimeType=obj["mimetype"],
-                            uri=obj["uri"],
-                        ),
-                    )
-                ]
-            )
+        obj_metadata.append(
+            {
+                "id": obj["objid"],
+                "structData": {
+                    # Map of all related objects
+                    "objs": obj_map,
+                    # Metadata for this one object
+                    "metadata": obj["metadata"],
+                    # Status of processing
+                    "status": obj["status"],
+                },
+                "content": {
+                    "mimeType": obj["mimetype"],
+                    "uri": obj["uri"],
+                },
+            }
+        )
+    return obj_metadata
 
-        # Write to JSON
-        if write_json:
-            json_metadata = GCSPath(str(obj["uri"]) + ".json")
-            json_metadata.write_text(
-                json.dumps(
-                    {
-                        "id": obj["objid"],
-                        "structData": obj_metadata,
-                        "content": {
-                            "mimeType": obj["mimetype"],
-                            "uri": obj["uri"],
-                        },
-                    },
-                    default=str,
-                )
+
+def extract_object(
+    source: GCSPath,
+    reject_dir: GCSPath,
+    supported_files: Dict[str, str],
+    write_json=True,
+    processor_pool: Optional[ProcessPool] = None,
+    result_cache: Optional[ResultCache] = None,
+    clear_outputs: bool = False,
+    expand_pool: Optional[Executor] = None,
+    limits: ExpansionLimits = ExpansionLimits(),
+) -> list[dict]:
+    """Extract an object, returning the metadata of the indexed objects
+
+    If clear_outputs, any outputs of an interrupted attempt are removed first.
+    """
+
+    logger.info(f"Processing {source}...")
+
+    if clear_outputs:
+        delete_output(GCSPath(str(source) + ".out"))
+
+    # Extract everything
+    objs = process_recursive(
+        source,
+        reject_dir,
+        supported_files,
+        processor_pool,
+        result_cache,
+        expand_pool,
+        limits,
+    )
+
+    logger.debug(f"Objects: {objs}")
+
+    obj_metadata = get_object_metadata(objs)
+
+    # Write to JSON
+    if write_json:
+        for metadata in obj_metadata:
+            json_metadata = GCSPath(str(metadata["content"]["uri"]) + ".json")
+            json_metadata.write_text(json.dumps(metadata, default=str))
+
+    return obj_metadata
+
+
+def write_bigquery_results(obj_metadata: list[dict], bq_writer: BigQueryWriter):
+    """Write the metadata of the indexed objects to BigQuery"""
+    bq_writer.write_results(
+        [
+            DocumentMetadata(
+                id=metadata["id"],
+                jsonData=json.dumps(metadata["structData"], default=str),
+                content=DocumentMetadata.Content(
+                    mimeType=metadata["content"]["mimeType"],
+                    uri=metadata["content"]["uri"],
+                ),
             )
+            for metadata in obj_metadata
+        ]
+    )
+
+
+def process_object(
+    source: GCSPath,
+    reject_dir: GCSPath,
+    supported_files: Dict[str, str],
+    write_json=True,
+    bq_writer: Optional[BigQueryWriter] = None,
+):
+    obj_metadata = extract_object(
+        source, reject_dir, supported_files, write_json=write_json
+    )
+
+    # Write to BigQuery if necessary
+    if bq_writer:
+        write_bigquery_results(obj_metadata, bq_writer)
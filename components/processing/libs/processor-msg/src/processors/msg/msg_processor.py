@@ -13,17 +13,33 @@
 # limitations under the License.
 
 
+import collections
+import contextlib
+import io
 import logging
-import pathlib
-from typing import Dict
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Collection, Dict, Optional
 
 from extract_msg import openMsg
+from extract_msg.attachments import Attachment, EmbeddedMsgAttachment
 from extract_msg.enums import ErrorBehavior
 from extract_msg.msg_classes import MessageBase
+from extract_msg.utils import prepareFilename
 from processors.base.gcsio import GCSPath
 
 error_behavior = ErrorBehavior.RTFDE | ErrorBehavior.ATTACH_NOT_IMPLEMENTED
 MAX_BODY_SIZE = 1024
+MAX_NAME_LENGTH = 256
+
+# Messages up to this size are read from GCS into memory, rather than
+# downloaded to a local file (reading the OLE structure is random access)
+MAX_IN_MEMORY_SIZE = 64 * 1024 * 1024
+
+# Outputs written concurrently (each held in memory until written)
+MSG_WRITE_WORKERS = int(os.environ.get("MSG_WRITE_WORKERS", "8"))
 logger = logging.getLogger(__name__)
 
 
@@ -40,40 +56,117 @@ def msg_to_dict(msg: MessageBase) -> Dict:
     )
 
 
+def get_attachment_filename(attachment: Attachment | EmbeddedMsgAttachment) -> str:
+    """Get the filename of an attachment, as it would be saved"""
+    filename = prepareFilename(attachment.getFilename())
+    if len(filename) > MAX_NAME_LENGTH:
+        name, ext = os.path.splitext(filename)
+        filename = name[: MAX_NAME_LENGTH - len(ext)] + ext
+    return filename
+
+
+def get_attachment_data(
+    attachment: Attachment | EmbeddedMsgAttachment,
+) -> Optional[bytes]:
+    """Get the contents of an attachment, embedded messages as .msg files"""
+    if isinstance(attachment, EmbeddedMsgAttachment):
+        with io.BytesIO() as b:
+            attachment.data.export(b)
+            return b.getvalue()
+    return attachment.data
+
+
+def save_attachment_locally(
+    attachment, output_dir: GCSPath, suffixes: Optional[Collection[str]]
+) -> list[tuple[GCSPath, bytes]]:
+    """Save an attachment of another type locally, returning its outputs"""
+    with tempfile.TemporaryDirectory() as d:
+        attachment.save(
+            allowFallback=True,
+            customPath=d,
+            skipBodyNotFound=True,
+            extractEmbedded=True,
+            skipNotImplemented=True,
+            overwriteExisting=True,
+        )
+        return [
+            (GCSPath(output_dir, str(file.relative_to(d))), file.read_bytes())
+            for file in sorted(Path(d).rglob("*"))
+            if file.is_file() and (suffixes is None or file.suffix in suffixes)
+        ]
+
+
 def msg_processor(
     source: GCSPath,
     output_dir: GCSPath,
+    suffixes: Optional[Collection[str]] = None,
 ) -> Dict:
+    """Extract the body and attachments of the message to the output folder
+
+    Attachments (with embedded messages as .msg files) are written under att/
+    as they are read, concurrently. Only attachments with the suffixes (if any)
+    are written.
+    """
     logger.info(f"Extracting message {source}")
 
+    if source.is_gcs() and source.size <= MAX_IN_MEMORY_SIZE:
+        reader = contextlib.nullcontext(source.read_bytes())
+    else:
+        reader = source.read_as_file()
+
     # Generate generic output
     with (
-        source.read_as_file() as r,
+        reader as r,
         openMsg(r, errorBehavior=error_behavior) as msg,
-        output_dir.write_folder() as output,
+        ThreadPoolExecutor(max_workers=MSG_WRITE_WORKERS) as executor,
     ):
 
         # It is a MessageBase (more exposed functionality)
         nmsg: MessageBase = msg  # pyright: ignore[reportAssignmentType]
 
-        # Extract attachments
-        nmsg.save(
-            allowFallback=True,
-            customPath=output,
-            customFilename="att",
-            skipBodyNotFound=True,
-            extractEmbedded=True,
-            skipNotImplemented=True,
-            overwriteExisting=True,
-            attachmentsOnly=True,
-        )
+        # The message is read here, the outputs are written in the executor
+        # with at most a few pending (and held in memory) per worker
+        pending: collections.deque = collections.deque()
+
+        def write(path: GCSPath, data: bytes):
+            pending.append(executor.submit(path.write_bytes, data))
+            if len(pending) >= MSG_WRITE_WORKERS * 2:
+                pending.popleft().result()
+
+        try:
+            # Extract attachments
+            attachment_dir = GCSPath(output_dir, "att")
+            for attachment in nmsg.attachments:
+                if not isinstance(attachment, (Attachment, EmbeddedMsgAttachment)):
+                    for path, data in save_attachment_locally(
+                        attachment, attachment_dir, suffixes
+                    ):
+                        write(path, data)
+                    continue
+
+                filename = get_attachment_filename(attachment)
+                if suffixes is not None and Path(filename).suffix not in suffixes:
+                    logger.debug("Skipping attachment %s of %s", filename, str(source))
+                    continue
+                data = get_attachment_data(attachment)
+                if data is not None:
+                    write(GCSPath(attachment_dir, filename), data)
+
+            # Extract message content
+            msg_name = f"{nmsg.defaultFolderName}.txt"  # pylint: disable=no-member
+            write(
+                GCSPath(output_dir, msg_name),
+                nmsg.getSaveBody(),  # pylint: disable=no-member
+            )
 
-        # Extract message content
-        msg_path = pathlib.Path(
-            output, f"{nmsg.defaultFolderName}.txt"
-        )  # pylint: disable=no-member
-        with open(msg_path, "wb") as f:
-            f.write(nmsg.getSaveBody())  # pylint: disable=no-member
+            while pending:
+                pending.popleft().result()
+        except BaseException:
+            # Writes not yet started are cancelled, so none are written after
+            # the failure (and the partial outputs can be deleted)
+            for future in pending:
+                future.cancel()
+            raise
 
         # Capture meta data
         return msg_to_dict(nmsg)
@@ -0,0 +1,158 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""ProcessPool for running processors isolated in worker processes"""
+
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+# Limits per file processed in a worker process (0 for no limit)
+PROCESSOR_TIMEOUT = float(os.environ.get("PROCESSOR_TIMEOUT", "300"))
+PROCESSOR_CPU_LIMIT = int(os.environ.get("PROCESSOR_CPU_LIMIT", "240"))
+PROCESSOR_MEMORY_LIMIT = int(
+    os.environ.get("PROCESSOR_MEMORY_LIMIT", str(4 * 1024 * 1024 * 1024))
+)
+
+# Files processed by a worker process before it is replaced
+PROCESSOR_MAX_TASKS_PER_CHILD = int(
+    os.environ.get("PROCESSOR_MAX_TASKS_PER_CHILD", "50")
+)
+
+
+def raise_cpu_limit_exceeded(signum, frame):
+    """Signal handler for the CPU limit, failing the call in progress"""
+    raise TimeoutError("CPU time limit exceeded")
+
+
+def init_worker_process(log_level: int, memory_limit: int):
+    """Initialize logging and the memory limit within a worker process"""
+    logging.basicConfig(level=log_level)
+    if memory_limit > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    # Exceeding the CPU limit fails the file, rather than killing the process
+    signal.signal(signal.SIGXCPU, raise_cpu_limit_exceeded)
+
+
+def run_limited(cpu_limit: int, fn: Callable[..., R], *args, **kwargs) -> R:
+    """Run fn within a worker process, limiting the CPU time it can use"""
+    if cpu_limit > 0:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime) + 1
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (used + cpu_limit, hard))
+    return fn(*args, **kwargs)
+
+
+class ProcessPool:
+    """ProcessPool - runs functions in worker processes, within limits
+
+    Each call is limited in wall-clock time (timeout), CPU time and memory, and
+    worker processes are replaced after max_tasks_per_child calls. Each worker
+    is its own single process executor, so a call that times out has only its
+    worker killed and replaced, leaving the calls in other workers running. A
+    call broken by its worker crashing is retried once, in a new worker.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        timeout: float = PROCESSOR_TIMEOUT,
+        cpu_limit: int = PROCESSOR_CPU_LIMIT,
+        memory_limit: int = PROCESSOR_MEMORY_LIMIT,
+        max_tasks_per_child: int = PROCESSOR_MAX_TASKS_PER_CHILD,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.max_tasks_per_child = max_tasks_per_child
+
+        # Calls are only submitted to an idle worker, so the timeout does not
+        # include waiting behind other calls
+        self.lock = threading.Lock()
+        self.replacements = 0
+        self.workers = [self.create_executor() for _ in range(max_workers)]
+        self.idle: queue.SimpleQueue[ProcessPoolExecutor] = queue.SimpleQueue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def create_executor(self) -> ProcessPoolExecutor:
+        """Create a worker, as an executor of a single process"""
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker_process,
+            initargs=(logging.getLogger().getEffectiveLevel(), self.memory_limit),
+            max_tasks_per_child=self.max_tasks_per_child or None,
+        )
+
+    def run(self, fn: Callable[..., R], *args, **kwargs) -> R:
+        """Run fn in a worker process, returning its result
+
+        Raises TimeoutError if the call exceeds its time limits.
+        """
+        worker = self.idle.get()
+        try:
+            retried = False
+            while True:
+                future = worker.submit(run_limited, self.cpu_limit, fn, *args, **kwargs)
+                done, _ = concurrent.futures.wait([future], self.timeout or None)
+                if not done:
+                    worker = self.replace(worker)
+                    raise TimeoutError(f"Processing timed out after {self.timeout}s")
+
+                try:
+                    return future.result()
+                except BrokenProcessPool:
+                    worker = self.replace(worker)
+                    if retried:
+                        raise
+                    retried = True
+                    logger.warning("Worker process broken, retrying")
+        finally:
+            self.idle.put(worker)
+
+    def replace(self, worker: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Replace a worker, killing its process"""
+        replacement = self.create_executor()
+        with self.lock:
+            self.workers[self.workers.index(worker)] = replacement
+            self.replacements += 1
+
+        logger.warning("Replacing worker process")
+        processes = worker._processes or {}  # pylint: disable=protected-access
+        for process in list(processes.values()):
+            process.kill()
+        worker.shutdown(wait=False, cancel_futures=True)
+        return replacement
+
+    def shutdown(self):
+        """Shut down the pool, waiting for its processes"""
+        with self.lock:
+            workers = list(self.workers)
+        for worker in workers:
+            worker.shutdown()
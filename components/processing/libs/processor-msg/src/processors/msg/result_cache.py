@@ -0,0 +1,106 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""ResultCache for reusing the outputs of processors on unchanged objects"""
+
+import json
+import logging
+from typing import Dict, Optional
+
+from processors.base.gcsio import GCSPath, copy_many
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """ResultCache - content-addressed store of processor outputs and metadata
+
+    Entries are keyed by the object hash (path and crc32c) with the processor
+    name and version, and laid out under the cache prefix as:
+
+        {key}/...      the outputs, relative to the output folder
+        {key}.json     the manifest, written last so entries are complete
+    """
+
+    def __init__(self, cache_dir: GCSPath):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def get_key(source: GCSPath, processor_name: str, version: str) -> str:
+        """Get the key of the outputs of a processor for an object"""
+        return source.get_hash(extra={"processor": processor_name, "version": version})
+
+    def restore(
+        self, source: GCSPath, processor_name: str, version: str, output: GCSPath
+    ) -> Optional[Dict]:
+        """Copy cached outputs to the output folder, returning the metadata
+
+        Returns None if there is no (complete) entry for the object.
+        """
+        key = self.get_key(source, processor_name, version)
+        manifest_path = GCSPath(self.cache_dir, key + ".json")
+        if not manifest_path.exists():
+            return None
+
+        manifest = json.loads(manifest_path.read_text())
+        result = copy_many(
+            (GCSPath(self.cache_dir, key, name), GCSPath(output, name))
+            for name in manifest["outputs"]
+        )
+        if result.failed:
+            logger.warning(
+                "Failed to restore %d cached outputs of %s, reprocessing",
+                len(result.failed),
+                str(source),
+            )
+            return None
+
+        logger.info("Restored %d cached outputs of %s", len(result.succeeded), source)
+        return manifest["metadata"]
+
+    def store(
+        self,
+        source: GCSPath,
+        processor_name: str,
+        version: str,
+        output: GCSPath,
+        metadata: Dict,
+    ):
+        """Copy the outputs of the processor for an object into the cache"""
+        key = self.get_key(source, processor_name, version)
+        # Listed as a folder, not matching siblings such as "{output}X"
+        prefix = output.path.rstrip("/") + "/"
+        names = [path.path[len(prefix) :] for path in GCSPath(str(output) + "/").list()]
+
+        result = copy_many(
+            (GCSPath(output, name), GCSPath(self.cache_dir, key, name))
+            for name in names
+        )
+        if result.failed:
+            logger.warning(
+                "Failed to cache %d outputs of %s", len(result.failed), str(source)
+            )
+            return
+
+        GCSPath(self.cache_dir, key + ".json").write_text(
+            json.dumps(
+                {
+                    "source": str(source),
+                    "processor": processor_name,
+                    "version": version,
+                    "outputs": names,
+                    "metadata": metadata,
+                },
+                default=str,
+            )
+        )
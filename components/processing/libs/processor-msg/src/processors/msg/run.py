@@ -15,9 +15,17 @@
 
 import argparse
 import logging
+import os
 
 from processors.base.gcsio import GCSPath
-from processors.msg.main_processor import Processors, process_all_objects
+from processors.msg.main_processor import (
+    MAX_EXPANDED_BYTES,
+    MAX_EXPANSION_DEPTH,
+    MAX_EXPANSION_FAN_OUT,
+    ExpansionLimits,
+    Processors,
+    process_all_objects,
+)
 
 
 # Specialized action to parse multiple key-value pairs into a dict
@@ -62,6 +70,85 @@ def main() -> None:
         default="",
         help="BigQuery fully qualified table to write results",
     )
+    parser.add_argument(
+        "--bigquery_stream",
+        choices=["default", "committed", "pending"],
+        default="default",
+        help="BigQuery write stream type, committed and pending streams "
+        "use offsets for exactly-once appends",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of objects to process concurrently",
+    )
+    parser.add_argument(
+        "--process_workers",
+        type=int,
+        default=0,
+        help="Number of worker processes for CPU bound processors "
+        "(0 runs them within the workers)",
+    )
+    parser.add_argument(
+        "--result_cache",
+        type=str,
+        default="",
+        help="Folder to cache processor outputs, reused for unchanged objects",
+    )
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default="",
+        help="Folder to checkpoint completed objects, resuming from it on retry "
+        "(BigQuery rows are then written to pending streams, committed with "
+        "each checkpoint)",
+    )
+    parser.add_argument(
+        "--shard_index",
+        type=int,
+        default=int(os.environ.get("CLOUD_RUN_TASK_INDEX", "0")),
+        help="Shard of the objects to process (defaults to the Cloud Run task)",
+    )
+    parser.add_argument(
+        "--shard_count",
+        type=int,
+        default=int(os.environ.get("CLOUD_RUN_TASK_COUNT", "1")),
+        help="Number of shards the objects are split into",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=["lpt", "listing"],
+        default="listing",
+        help="Order of processing, listing streams the objects in listing order, "
+        "lpt starts the longest (predicted) objects first but reads the whole "
+        "listing into memory first",
+    )
+    parser.add_argument(
+        "--expand_workers",
+        type=int,
+        default=None,
+        help="Number of expanded objects to process concurrently "
+        "(defaults to the workers, 0 processes them within the workers)",
+    )
+    parser.add_argument(
+        "--max_depth",
+        type=int,
+        default=MAX_EXPANSION_DEPTH,
+        help="Levels of nesting to expand (e.g. zips within zips)",
+    )
+    parser.add_argument(
+        "--max_fan_out",
+        type=int,
+        default=MAX_EXPANSION_FAN_OUT,
+        help="Number of objects to expand from each object",
+    )
+    parser.add_argument(
+        "--max_expanded_bytes",
+        type=int,
+        default=MAX_EXPANDED_BYTES,
+        help="Total size of the objects to expand from each object",
+    )
     all_processors = ", ".join([x.value for x in Processors])
     parser.add_argument(
         "--file-type",
@@ -87,6 +174,20 @@ def main() -> None:
         args.supported_files,
         write_json=args.write_json,
         write_bigquery=args.write_bigquery,
+        workers=args.workers,
+        process_workers=args.process_workers,
+        bigquery_stream=args.bigquery_stream,
+        result_cache=args.result_cache,
+        checkpoint_dir=args.checkpoint_dir,
+        shard_index=args.shard_index,
+        shard_count=args.shard_count,
+        schedule=args.schedule,
+        expand_workers=args.expand_workers,
+        limits=ExpansionLimits(
+            max_depth=args.max_depth,
+            max_fan_out=args.max_fan_out,
+            max_bytes=args.max_expanded_bytes,
+        ),
     )
 
 
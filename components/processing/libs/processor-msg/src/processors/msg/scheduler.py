@@ -0,0 +1,131 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Scheduler ordering objects by their predicted processing time"""
+
+import dataclasses
+import heapq
+import logging
+import threading
+from typing import Dict, Iterable, Tuple
+
+from processors.base.gcsio import GCSPath
+
+logger = logging.getLogger(__name__)
+
+# Predicted cost of processing an object, by processor, as
+# (seconds per object, seconds per MB)
+DEFAULT_COST = (0.05, 0.01)
+PROCESSOR_COSTS: Dict[str, Tuple[float, float]] = {
+    "txt-processor": (0.05, 0.0),
+    "msg-processor": (0.3, 5.0),
+    "xlsx-processor": (0.2, 8.0),
+    "zip-processor": (0.1, 8.0),
+}
+
+# Number of objects listed in the report of predicted vs actual durations
+REPORT_TOP_OBJECTS = 10
+
+
+@dataclasses.dataclass
+class ScheduledObject:
+    """An object with its predicted (and once processed, actual) duration"""
+
+    obj: GCSPath
+    size: int
+    predicted: float
+    actual: float = 0.0
+
+
+class Scheduler:
+    """Scheduler - orders objects longest-processing-time-first
+
+    The cost of each object is predicted from the listing metadata (its size,
+    and the processor for its suffix), so the largest objects are started first
+    rather than dominating the end of the run.
+    """
+
+    def __init__(self, supported_files: Dict[str, str], workers: int = 1):
+        self.supported_files = supported_files
+        self.workers = max(workers, 1)
+        self.lock = threading.Lock()
+        self.scheduled: Dict[str, ScheduledObject] = {}
+
+    def predict(self, obj: GCSPath) -> ScheduledObject:
+        """Predict the duration of processing an object"""
+        per_object, per_mb = PROCESSOR_COSTS.get(
+            self.supported_files.get(obj.suffix, ""), DEFAULT_COST
+        )
+        size = obj.size
+        return ScheduledObject(obj, size, per_object + per_mb * size / 1024 / 1024)
+
+    def order(self, objects: Iterable[GCSPath]) -> list[GCSPath]:
+        """Order the objects by predicted duration, longest first
+
+        The listing is read in full, ties are kept in listing order.
+        """
+        scheduled = sorted(
+            (self.predict(obj) for obj in objects),
+            key=lambda s: s.predicted,
+            reverse=True,
+        )
+        self.scheduled = {str(s.obj): s for s in scheduled}
+
+        logger.info(
+            "Scheduled %d objects (%d bytes), predicting %.1fs over %d workers",
+            len(scheduled),
+            sum(s.size for s in scheduled),
+            self.makespan([s.predicted for s in scheduled]),
+            self.workers,
+        )
+        return [s.obj for s in scheduled]
+
+    def makespan(self, durations: Iterable[float]) -> float:
+        """Get the duration of running the durations in order on the workers"""
+        finish = [0.0] * self.workers
+        for duration in durations:
+            heapq.heapreplace(finish, finish[0] + duration)
+        return max(finish)
+
+    def record(self, obj: GCSPath, actual: float):
+        """Record the actual duration of processing an object"""
+        with self.lock:
+            scheduled = self.scheduled.get(str(obj))
+            if scheduled is not None:
+                scheduled.actual = actual
+
+    def report(self):
+        """Log the predicted vs actual durations"""
+        scheduled = list(self.scheduled.values())
+        if not scheduled:
+            return
+
+        logger.info(
+            "Predicted %.1fs, actual %.1fs of processing for %d objects "
+            "(predicted %.1fs, actual %.1fs over %d workers)",
+            sum(s.predicted for s in scheduled),
+            sum(s.actual for s in scheduled),
+            len(scheduled),
+            self.makespan([s.predicted for s in scheduled]),
+            self.makespan([s.actual for s in scheduled]),
+            self.workers,
+        )
+        slowest = sorted(scheduled, key=lambda s: s.actual, reverse=True)
+        for s in slowest[:REPORT_TOP_OBJECTS]:
+            logger.info(
+                "%s (%d bytes): predicted %.2fs, actual %.2fs",
+                str(s.obj),
+                s.size,
+                s.predicted,
+                s.actual,
+            )
@@ -0,0 +1,66 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from processors.base.gcsio import GCSPath
+from processors.base.memory_storage import MemoryClient
+from processors.msg.checkpoint import Checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+    """Records completed objects, and reads them back on resuming"""
+
+    def setUp(self):
+        GCSPath.use_client(MemoryClient())
+        self.addCleanup(GCSPath.use_client, None)
+        env = mock.patch.dict(os.environ)
+        env.start()
+        self.addCleanup(env.stop)
+        os.environ.pop("CLOUD_RUN_TASK_ATTEMPT", None)
+
+    def checkpoint(self, checkpoint_dir: str, uri: str):
+        """Checkpoint an object as completed, with a row"""
+        checkpoint = Checkpoint(GCSPath(checkpoint_dir))
+        self.assertFalse(checkpoint.resuming)
+        checkpoint.record(GCSPath(uri), [f"id-{uri}"])
+        checkpoint.flush()
+
+    def assertSiblings(self, parent: str):
+        # The checkpoint of one folder is not read by a sibling sharing its prefix
+        self.checkpoint(f"{parent}/checkpoint-xls", "gs://memory/a.xls")
+        self.checkpoint(f"{parent}/checkpoint-xlsx", "gs://memory/a.xlsx")
+
+        for suffix in ("xls", "xlsx", "xlsx/"):
+            with self.subTest(parent=parent, suffix=suffix):
+                checkpoint = Checkpoint(GCSPath(f"{parent}/checkpoint-{suffix}"))
+                self.assertTrue(checkpoint.resuming)
+                uri = "gs://memory/a." + suffix.rstrip("/")
+                self.assertEqual(checkpoint.completed, {uri: [f"id-{uri}"]})
+
+    def test_siblings(self):
+        self.assertSiblings("gs://memory/run")
+        with tempfile.TemporaryDirectory() as d:
+            self.assertSiblings(d)
+
+    def test_attempt(self):
+        # A retried attempt is resuming, even with nothing yet checkpointed
+        with mock.patch.dict(os.environ, {"CLOUD_RUN_TASK_ATTEMPT": "1"}):
+            checkpoint = Checkpoint(GCSPath("gs://memory/run/checkpoint"))
+        self.assertTrue(checkpoint.resuming)
+        self.assertEqual(checkpoint.completed, {})
@@ -0,0 +1,372 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import io
+import json
+import os
+import threading
+import time
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from unittest import mock
+
+from faker import Faker
+from processors.base.gcsio import GCSPath
+from processors.base.memory_storage import MemoryClient
+from processors.msg import main_processor
+from processors.msg.checkpoint import Checkpoint
+from processors.msg.main_processor import (
+    LISTING_READ_AHEAD,
+    ExpansionLimits,
+    process_all_objects,
+    process_recursive,
+)
+from processors.msg.msg_generator import MSGGenerator
+
+SUPPORTED_FILES = {
+    ".txt": "txt-processor",
+    ".xlsx": "xlsx-processor",
+    ".msg": "msg-processor",
+    ".zip": "zip-processor",
+}
+
+
+class Crash(Exception):
+    """The job crashing, losing anything not committed"""
+
+
+class FakeWriter:
+    """Fake BigQueryWriter, adding rows to the table once they are visible
+
+    Rows on pending streams are only visible once committed, others once
+    written. The writer crashes on the crash_on_write'th write.
+    """
+
+    def __init__(self, table: list, stream_type: str, crash_on_write: Optional[int]):
+        self.table = table
+        self.stream_type = stream_type
+        self.crash_on_write = crash_on_write
+        self.writes = 0
+        self.pending: list = []
+        self.crashed = False
+
+    def write_results(self, results):
+        self.writes += 1
+        if self.writes == self.crash_on_write:
+            self.crashed = True
+            raise Crash()
+
+        ids = [result.id for result in results]
+        if self.stream_type == "pending":
+            self.pending.extend(ids)
+        else:
+            self.table.extend(ids)
+
+    def commit(self):
+        if self.crashed:
+            raise Crash()
+        self.table.extend(self.pending)
+        self.pending = []
+
+    def close(self):
+        self.commit()
+
+
+class TestProcessAllObjects(unittest.TestCase):
+    """Runs process_all_objects against the in-memory backend"""
+
+    @classmethod
+    def setUpClass(cls):
+        Faker.seed(0)
+        generator = MSGGenerator()
+        cls.messages = [generator.to_bytes() for _ in range(3)]
+
+    def setUp(self):
+        self.use_new_client()
+        self.addCleanup(GCSPath.use_client, None)
+
+    def use_new_client(self):
+        """Use a new (empty) in-memory backend"""
+        self.client = MemoryClient()
+        GCSPath.use_client(self.client)
+
+        # Paths bind their bucket on first use, so are created for the backend
+        self.source_dir = GCSPath("gs://memory/run/process")
+        self.reject_dir = GCSPath("gs://memory/run/reject/")
+
+    def write_objects(self):
+        """Write the messages and some text objects to the source folder"""
+        for i, data in enumerate(self.messages):
+            GCSPath(self.source_dir, f"message-{i}.msg").write_bytes(data)
+            GCSPath(self.source_dir, f"text-{i}.txt").write_text(f"text {i}")
+
+    def read_json(self) -> dict:
+        """Read the JSON metadata written for the indexed objects"""
+        return {
+            str(path): json.loads(path.read_text())
+            for path in self.source_dir.list()
+            if path.suffix == ".json"
+        }
+
+    def run_objects(self, **kwargs) -> dict:
+        """Process the objects with a new backend, returning the JSON metadata"""
+        self.use_new_client()
+        self.write_objects()
+        process_all_objects(self.source_dir, self.reject_dir, SUPPORTED_FILES, **kwargs)
+        return self.read_json()
+
+    def test_workers(self):
+        expected = self.run_objects(workers=1)
+        self.assertGreater(len(expected), len(self.messages))
+        self.assertEqual(self.run_objects(workers=4), expected)
+
+    def test_rejected(self):
+        bad = GCSPath(self.source_dir, "bad.msg")
+        bad.write_bytes(b"not a message")
+        process_all_objects(self.source_dir, self.reject_dir, SUPPORTED_FILES)
+
+        self.assertFalse(bad.exists())
+        self.assertEqual(
+            GCSPath(self.reject_dir, "bad.msg").read_bytes(), b"not a message"
+        )
+        error = json.loads(GCSPath(self.reject_dir, "bad.msg.json").read_text())
+        self.assertIn("Doc processor fail", error["error_msg"])
+
+    def run_checkpointed(self, table: list, crash_on_write: Optional[int] = None):
+        """Process the objects with a checkpoint, writing rows to the table"""
+        with mock.patch.object(
+            main_processor,
+            "BigQueryWriter",
+            side_effect=lambda _, stream_type: FakeWriter(
+                table, stream_type, crash_on_write
+            ),
+        ):
+            process_all_objects(
+                self.source_dir,
+                self.reject_dir,
+                SUPPORTED_FILES,
+                write_json=False,
+                write_bigquery="project.dataset.table",
+                checkpoint_dir="gs://memory/run/checkpoint",
+            )
+
+    def test_resume(self):
+        expected: list = []
+        self.write_objects()
+        self.run_checkpointed(expected)
+        self.assertEqual(len(set(expected)), len(expected))
+
+        # Crashing with some objects checkpointed (or none), then resuming
+        for checkpointed in (True, False):
+            with self.subTest(checkpointed=checkpointed), mock.patch.object(
+                Checkpoint, "is_due", return_value=checkpointed
+            ):
+                self.use_new_client()
+                self.write_objects()
+                table: list = []
+                with self.assertRaises(Crash):
+                    self.run_checkpointed(table, crash_on_write=4)
+                self.assertEqual(bool(table), checkpointed)
+
+                # Retried as the next attempt of the task
+                with mock.patch.dict(os.environ, {"CLOUD_RUN_TASK_ATTEMPT": "1"}):
+                    self.run_checkpointed(table)
+                self.assertEqual(sorted(table), sorted(expected))
+
+    def test_read_ahead(self):
+        workers = 3
+        count = 50
+        lock = threading.Lock()
+        completed: list[str] = []
+        ahead: list[int] = []
+
+        for i in range(count):
+            GCSPath(self.source_dir, f"obj-{i}.txt").write_text("text")
+
+        def listing():
+            for i in range(count):
+                with lock:
+                    ahead.append(i - len(completed))
+                yield GCSPath(self.source_dir, f"obj-{i}.txt")
+
+        def extract(obj, **_):
+            time.sleep(0.001 * (hash(str(obj)) % 5))
+            with lock:
+                completed.append(str(obj))
+            return []
+
+        # The listing is only read as far ahead of the results as workers allow
+        with mock.patch.object(GCSPath, "list", side_effect=listing), mock.patch.object(
+            main_processor, "extract_object", side_effect=extract
+        ):
+            process_all_objects(
+                self.source_dir, self.reject_dir, SUPPORTED_FILES, workers=workers
+            )
+        self.assertEqual(len(completed), count)
+        self.assertLessEqual(max(ahead), workers * LISTING_READ_AHEAD)
+
+        # Unlike longest-first, which reads the whole listing first
+        completed.clear()
+        ahead.clear()
+        with mock.patch.object(GCSPath, "list", side_effect=listing), mock.patch.object(
+            main_processor, "extract_object", side_effect=extract
+        ):
+            process_all_objects(
+                self.source_dir,
+                self.reject_dir,
+                SUPPORTED_FILES,
+                workers=workers,
+                schedule="lpt",
+            )
+        self.assertEqual(max(ahead), count - 1)
+
+    def test_shards(self):
+        expected = self.run_objects()
+
+        # Each object is processed by exactly one of the shards
+        self.use_new_client()
+        self.write_objects()
+        shards = []
+        for shard_index in range(3):
+            before = self.read_json()
+            process_all_objects(
+                self.source_dir,
+                self.reject_dir,
+                SUPPORTED_FILES,
+                shard_index=shard_index,
+                shard_count=3,
+            )
+            shards.append(self.read_json().keys() - before.keys())
+        self.assertEqual(self.read_json(), expected)
+        self.assertEqual(sum(len(shard) for shard in shards), len(expected))
+        self.assertTrue(all(shards))
+
+        with self.assertRaises(ValueError):
+            process_all_objects(
+                self.source_dir,
+                self.reject_dir,
+                SUPPORTED_FILES,
+                shard_index=3,
+                shard_count=3,
+            )
+
+
+def zip_bytes(members: dict) -> bytes:
+    """Create a zip archive of the named members"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return buffer.getvalue()
+
+
+class TestProcessRecursive(unittest.TestCase):
+    """Expands nested archives in the in-memory backend"""
+
+    def setUp(self):
+        GCSPath.use_client(MemoryClient())
+        self.addCleanup(GCSPath.use_client, None)
+        self.reject_dir = GCSPath("gs://memory/reject/")
+
+        inner = zip_bytes({"c.txt": "c", "d.txt": "d"})
+        self.source = GCSPath("gs://memory/process/outer.zip")
+        self.source.write_bytes(zip_bytes({"a.txt": "a", "b.zip": inner, "e.txt": "e"}))
+        self.output = str(self.source) + ".out"
+
+    def process(self, **kwargs) -> dict:
+        """Process the archive, returning the statuses by (relative) uri"""
+        results = process_recursive(
+            GCSPath(str(self.source)), self.reject_dir, SUPPORTED_FILES, **kwargs
+        )
+        return {
+            result["uri"][len(str(self.source)) :]: result["status"]
+            for result in results
+        }
+
+    def test_depth_first(self):
+        expected = [
+            "",
+            ".out/a.txt",
+            ".out/b.zip",
+            ".out/b.zip.out/c.txt",
+            ".out/b.zip.out/d.txt",
+            ".out/e.txt",
+        ]
+
+        # Sibling objects sharing the output prefix are not expanded
+        GCSPath(self.output + "line.txt").write_text("sibling")
+        self.assertEqual(list(self.process()), expected)
+
+        # The same order when expanded concurrently
+        for path in GCSPath(self.output + "/").list():
+            path.delete()
+        with ThreadPoolExecutor(max_workers=4) as expand_pool:
+            self.assertEqual(list(self.process(expand_pool=expand_pool)), expected)
+
+    def test_max_depth(self):
+        statuses = self.process(limits=ExpansionLimits(max_depth=1))
+        self.assertEqual(list(statuses), ["", ".out/a.txt", ".out/b.zip", ".out/e.txt"])
+        self.assertIn("over the depth limit of 1", statuses[".out/b.zip"])
+
+    def test_max_fan_out(self):
+        statuses = self.process(limits=ExpansionLimits(max_fan_out=2))
+        self.assertEqual(
+            list(statuses),
+            [
+                "",
+                ".out/a.txt",
+                ".out/b.zip",
+                ".out/b.zip.out/c.txt",
+                ".out/b.zip.out/d.txt",
+            ],
+        )
+        self.assertIn("1 of 3 objects not processed", statuses[""])
+
+    def test_max_bytes(self):
+        statuses = self.process(limits=ExpansionLimits(max_bytes=1))
+        self.assertEqual(list(statuses), ["", ".out/a.txt"])
+        self.assertIn("2 of 3 objects not processed", statuses[""])
+
+    def test_failure(self):
+        # The second member is corrupt, so fails once the first is written
+        archive = zip_bytes({"a.txt": "aaaaaaaa", "b.txt": "bbbbbbbb"})
+        self.source.write_bytes(archive.replace(b"bbbbbbbb", b"xxxxxxxx"))
+        with mock.patch("processors.zip.unzip_processor.UNZIP_WORKERS", 1):
+            statuses = self.process()
+
+        # The partial outputs are deleted with the archive rejected
+        self.assertIn("Processor failed", statuses[""])
+        self.assertEqual(list(GCSPath(self.output + "/").list()), [])
+        self.assertFalse(GCSPath(str(self.source)).exists())
+        self.assertTrue(GCSPath(self.reject_dir, "outer.zip").exists())
+
+    def test_failure_message(self):
+        Faker.seed(1)
+        source = GCSPath("gs://memory/process/message.msg")
+        source.write_bytes(MSGGenerator().to_bytes())
+
+        # The attachments are written before the message fails
+        with mock.patch(
+            "processors.msg.msg_processor.msg_to_dict",
+            side_effect=ValueError("unreadable"),
+        ):
+            results = process_recursive(
+                GCSPath(str(source)), self.reject_dir, SUPPORTED_FILES
+            )
+        self.assertIn("unreadable", results[0]["status"])
+        self.assertEqual(list(GCSPath(str(source) + ".out/").list()), [])
+        self.assertTrue(GCSPath(self.reject_dir, "message.msg").exists())
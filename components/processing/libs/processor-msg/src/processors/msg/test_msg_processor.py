@@ -0,0 +1,92 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import importlib
+import tempfile
+import unittest
+from unittest import mock
+
+from extract_msg import openMsg
+from faker import Faker
+from processors.base.gcsio import GCSPath
+from processors.base.memory_storage import MemoryClient
+from processors.msg.msg_generator import MSGGenerator
+from processors.msg.msg_processor import msg_processor, save_attachment_locally
+
+# The module, as the package exports its function of the same name
+msg = importlib.import_module("processors.msg.msg_processor")
+
+
+class TestMsgProcessor(unittest.TestCase):
+    """Streams messages to the in-memory backend, and local files"""
+
+    @classmethod
+    def setUpClass(cls):
+        # A message with both spreadsheet and message attachments
+        Faker.seed(1)
+        cls.message = MSGGenerator().to_bytes()
+
+    def setUp(self):
+        GCSPath.use_client(MemoryClient())
+        self.addCleanup(GCSPath.use_client, None)
+        self.source = GCSPath("gs://memory/process/message.msg")
+        self.source.write_bytes(self.message)
+
+    @staticmethod
+    def read_outputs(output: GCSPath) -> dict:
+        prefix = output.path + "/"
+        return {
+            path.path[len(prefix) :]: path.read_bytes()
+            for path in GCSPath(str(output) + "/").list()
+        }
+
+    def expected_attachments(self) -> dict:
+        """Get the attachments as saved by extract_msg"""
+        output = GCSPath("gs://memory/expected")
+        with openMsg(self.message) as m:
+            return {
+                path.path[len(output.path) + 1 :]: data
+                for attachment in m.attachments
+                for path, data in save_attachment_locally(
+                    attachment, GCSPath(output, "att"), None
+                )
+            }
+
+    def test_outputs(self):
+        output = GCSPath(str(self.source) + ".out")
+        metadata = msg_processor(self.source, output)
+        outputs = self.read_outputs(output)
+
+        attachments = {k: v for k, v in outputs.items() if k.startswith("att/")}
+        self.assertEqual(attachments, self.expected_attachments())
+        self.assertEqual(
+            {name.rsplit(".", 1)[-1] for name in attachments}, {"xlsx", "msg"}
+        )
+        self.assertEqual(len(outputs), len(attachments) + 1)
+
+        # The same outputs reading the message from a file, and to files
+        with tempfile.TemporaryDirectory() as d, mock.patch.object(
+            msg, "MAX_IN_MEMORY_SIZE", 0
+        ):
+            local = GCSPath(d, "message.msg.out")
+            self.assertEqual(msg_processor(self.source, local), metadata)
+            self.assertEqual(self.read_outputs(local), outputs)
+
+    def test_suffixes(self):
+        output = GCSPath(str(self.source) + ".out")
+        msg_processor(self.source, output, suffixes=[".msg", ".txt"])
+        names = list(self.read_outputs(output))
+        self.assertTrue(any(name.startswith("att/") for name in names))
+        self.assertFalse(any(name.endswith(".xlsx") for name in names))
@@ -0,0 +1,119 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from processors.msg.process_pool import ProcessPool
+
+
+def crash_once(flag: str) -> int:
+    """Crash the worker process the first time called (for the flag)"""
+    if not os.path.exists(flag):
+        Path(flag).touch()
+        os._exit(1)
+    return os.getpid()
+
+
+def count_and_sleep(counter: str, seconds: float) -> int:
+    """Count the call in the file, then sleep for the seconds"""
+    with open(counter, "a", encoding="utf8") as f:
+        f.write("call\n")
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def spin(seconds: float):
+    """Use CPU time for the seconds"""
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+
+class TestProcessPool(unittest.TestCase):
+    """Runs functions in worker processes, within limits"""
+
+    def create_pool(self, **kwargs) -> ProcessPool:
+        kwargs.setdefault("timeout", 60)
+        pool = ProcessPool(2, **kwargs)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def test_run(self):
+        pool = self.create_pool(max_tasks_per_child=1)
+        self.assertEqual(pool.run(pow, 2, 10), 1024)
+        with self.assertRaises(ValueError):
+            pool.run(int, "not a number")
+
+        # Each worker process is replaced after its calls
+        pids = {pool.run(os.getpid) for _ in range(3)}
+        self.assertEqual(len(pids), 3)
+
+    def test_timeout(self):
+        # Long enough for the worker processes to start
+        pool = self.create_pool(timeout=5)
+        with self.assertRaisesRegex(TimeoutError, "timed out after 5s"):
+            pool.run(time.sleep, 60)
+
+        # The worker is replaced, killing its process, so can still be used
+        self.assertEqual(pool.replacements, 1)
+        self.assertEqual(pool.run(pow, 2, 3), 8)
+
+    def test_timeout_alongside(self):
+        pool = self.create_pool(timeout=5)
+        with tempfile.TemporaryDirectory() as d, ThreadPoolExecutor(2) as executor:
+            # Both worker processes started
+            list(executor.map(pool.run, [time.sleep] * 2, [1] * 2))
+
+            # A call running alongside one timing out is left running, once
+            counter = os.path.join(d, "counter")
+            timed_out = executor.submit(pool.run, time.sleep, 60)
+            time.sleep(2)
+            healthy = executor.submit(pool.run, count_and_sleep, counter, 4)
+            with self.assertRaises(TimeoutError):
+                timed_out.result()
+            self.assertFalse(healthy.done())
+            self.assertNotEqual(healthy.result(), os.getpid())
+            with open(counter, encoding="utf8") as f:
+                self.assertEqual(f.read().splitlines(), ["call"])
+        self.assertEqual(pool.replacements, 1)
+
+    def test_cpu_limit(self):
+        pool = self.create_pool(cpu_limit=1)
+        with self.assertRaisesRegex(TimeoutError, "CPU time limit exceeded"):
+            pool.run(spin, 10)
+        self.assertEqual(pool.run(pow, 2, 3), 8)
+
+    def test_memory_limit(self):
+        pool = self.create_pool(memory_limit=1024 * 1024 * 1024)
+        with self.assertRaises(MemoryError):
+            pool.run(bytearray, 2 * 1024 * 1024 * 1024)
+
+    def test_broken_pool(self):
+        pool = self.create_pool()
+        with tempfile.TemporaryDirectory() as d:
+            # A call broken by a worker crashing is retried (once)
+            flag = os.path.join(d, "crashed")
+            self.assertNotEqual(pool.run(crash_once, flag), os.getpid())
+            self.assertEqual(pool.replacements, 1)
+
+        with self.assertRaises(BrokenProcessPool):
+            pool.run(os._exit, 1)
+        self.assertEqual(pool.replacements, 3)
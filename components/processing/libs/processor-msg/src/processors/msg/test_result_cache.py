@@ -0,0 +1,72 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+from processors.base.gcsio import GCSPath
+from processors.base.memory_storage import MemoryClient
+from processors.msg.result_cache import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+    """Runs the ResultCache against the in-memory backend"""
+
+    def setUp(self):
+        GCSPath.use_client(MemoryClient())
+        self.addCleanup(GCSPath.use_client, None)
+        self.cache = ResultCache(GCSPath("gs://memory/cache"))
+        self.source = GCSPath("gs://memory/process/archive.zip")
+        self.source.write_bytes(b"archive")
+        self.outputs = {"a.txt": "a", "sub/b.txt": "b"}
+
+    def write_outputs(self, output: GCSPath):
+        for name, text in self.outputs.items():
+            GCSPath(output, name).write_text(text)
+
+    def read_outputs(self, output: GCSPath) -> dict:
+        prefix = output.path + "/"
+        return {
+            path.path[len(prefix) :]: path.read_text()
+            for path in GCSPath(str(output) + "/").list()
+        }
+
+    def test_store_restore(self):
+        output = GCSPath(str(self.source) + ".out")
+        self.write_outputs(output)
+
+        # Sibling objects sharing the output prefix are not outputs
+        GCSPath(str(output) + "line.txt").write_text("sibling")
+
+        self.cache.store(self.source, "zip-processor", "1", output, {"key": 1})
+        restored = GCSPath("gs://memory/restored/archive.zip.out")
+        self.assertEqual(
+            self.cache.restore(self.source, "zip-processor", "1", restored),
+            {"key": 1},
+        )
+        self.assertEqual(self.read_outputs(restored), self.outputs)
+
+    def test_restore_changed(self):
+        output = GCSPath(str(self.source) + ".out")
+        self.write_outputs(output)
+        self.cache.store(self.source, "zip-processor", "1", output, {})
+
+        # Other versions, and changed objects, are not restored
+        restored = GCSPath("gs://memory/restored/archive.zip.out")
+        self.assertIsNone(
+            self.cache.restore(self.source, "zip-processor", "2", restored)
+        )
+        changed = GCSPath(str(self.source))
+        changed.write_bytes(b"changed")
+        self.assertIsNone(self.cache.restore(changed, "zip-processor", "1", restored))
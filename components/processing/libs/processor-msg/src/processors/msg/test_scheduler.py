@@ -0,0 +1,72 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+from processors.base.gcsio import GCSPath
+from processors.base.memory_storage import MemoryClient
+from processors.msg.scheduler import Scheduler
+
+SUPPORTED_FILES = {
+    ".txt": "txt-processor",
+    ".msg": "msg-processor",
+}
+
+
+class TestScheduler(unittest.TestCase):
+    """Runs the Scheduler against objects in the in-memory backend"""
+
+    def setUp(self):
+        GCSPath.use_client(MemoryClient())
+        self.addCleanup(GCSPath.use_client, None)
+
+    @staticmethod
+    def write_object(name: str, size: int) -> GCSPath:
+        path = GCSPath("gs://memory/process", name)
+        path.write_bytes(b"x" * size)
+        return GCSPath(str(path))
+
+    def test_order(self):
+        small = self.write_object("small.msg", 1024)
+        large = self.write_object("large.msg", 1024 * 1024)
+        text = self.write_object("large.txt", 1024 * 1024)
+        small_text = self.write_object("small.txt", 1)
+        other = self.write_object("other.bin", 1024)
+
+        # Longest first, by size and processor, ties kept in listing order
+        scheduler = Scheduler(SUPPORTED_FILES, workers=2)
+        order = scheduler.order([small_text, text, small, other, large])
+        self.assertEqual(
+            [str(obj) for obj in order],
+            [str(large), str(small), str(other), str(small_text), str(text)],
+        )
+        self.assertEqual(scheduler.scheduled[str(large)].size, 1024 * 1024)
+
+    def test_record(self):
+        obj = self.write_object("a.txt", 1)
+        scheduler = Scheduler(SUPPORTED_FILES)
+        scheduler.order([obj])
+        scheduler.record(obj, 2.5)
+        scheduler.record(GCSPath("gs://memory/process/unknown.txt"), 1.0)
+        self.assertEqual(
+            [s.actual for s in scheduler.scheduled.values()],
+            [2.5],
+        )
+
+    def test_makespan(self):
+        self.assertEqual(Scheduler({}, workers=2).makespan([4, 3, 2, 1]), 5)
+        self.assertEqual(Scheduler({}, workers=2).makespan([1, 2, 3, 4]), 6)
+        self.assertEqual(Scheduler({}, workers=0).makespan([1, 2, 3]), 6)
+        self.assertEqual(Scheduler({}, workers=3).makespan([]), 0)
@@ -0,0 +1,69 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Microbenchmark of cleansing and formatting sheet rows as Markdown
+
+Compares formatting one cell at a time against in batches of rows, on rows of
+generated cells (a sheet of 1M cells by default), e.g.
+
+    python benchmarks/bench_markdown_rows.py --rows 100000 --columns 10
+"""
+
+import argparse
+import itertools
+import time
+
+from faker import Faker
+from processors.xlsx.xlsx_generator import XLSXGenerator
+from processors.xlsx.xlsx_processor import (
+    XLSX_BATCH_ROWS,
+    cleanse_string,
+    markdown_row,
+    markdown_rows,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--columns", type=int, default=10)
+    args = parser.parse_args()
+
+    # Generate a pool of rows (as the generator's sheets), repeated to size
+    Faker.seed(0)
+    sheet = XLSXGenerator().get_sheet(
+        min_cols=args.columns, max_cols=args.columns, min_rows=1000, max_rows=1000
+    )
+    rows = list(itertools.islice(itertools.cycle(sheet[1:]), args.rows))
+    cells = args.rows * args.columns
+
+    start = time.perf_counter()
+    by_cell = [markdown_row([cleanse_string(v) for v in row]) for row in rows]
+    cell_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    by_batch = []
+    for i in range(0, len(rows), XLSX_BATCH_ROWS):
+        by_batch.extend(markdown_rows(rows[i : i + XLSX_BATCH_ROWS]))
+    batch_time = time.perf_counter() - start
+
+    assert by_cell == by_batch
+    for name, duration in [("per cell", cell_time), ("batched", batch_time)]:
+        print(
+            f"{cells:>9} cells {name:>9}: {duration:6.2f}s, "
+            f"{cells / duration:>12,.0f} cells/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
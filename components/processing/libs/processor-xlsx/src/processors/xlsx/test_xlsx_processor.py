@@ -0,0 +1,297 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime
+import io
+import tempfile
+import unittest
+from unittest import mock
+
+import openpyxl
+import pyexcel
+from faker import Faker
+from openpyxl.styles import Font
+from processors.base.gcsio import GCSPath
+from processors.base.memory_storage import MemoryClient
+from processors.xlsx.xlsx_generator import XLSXGenerator
+from processors.xlsx.xlsx_processor import (
+    cleanse_string,
+    markdown_row,
+    markdown_rows,
+    split_line,
+    write_markdown,
+    xlsx_processor,
+)
+
+
+def workbook_bytes(book: openpyxl.Workbook) -> bytes:
+    with io.BytesIO() as b:
+        book.save(b)
+        return b.getvalue()
+
+
+class TestXLSXProcessor(unittest.TestCase):
+    """Streams workbooks to Markdown in the in-memory backend"""
+
+    def setUp(self):
+        GCSPath.use_client(MemoryClient())
+        self.addCleanup(GCSPath.use_client, None)
+        self.source = GCSPath("gs://memory/process/book.xlsx")
+        self.output = GCSPath("gs://memory/process/book.xlsx.out")
+
+    @staticmethod
+    def read_outputs(output: GCSPath) -> dict:
+        prefix = output.path + "/"
+        return {
+            path.path[len(prefix) :]: path.read_text()
+            for path in GCSPath(str(output) + "/").list()
+        }
+
+    def pyexcel_outputs(self, data: bytes) -> dict:
+        """Get the outputs of the sheets as read by pyexcel"""
+        output = GCSPath("gs://memory/expected")
+        with tempfile.NamedTemporaryFile(suffix=".xlsx") as f:
+            f.write(data)
+            f.flush()
+            book = pyexcel.get_book(file_name=f.name)
+            for name in book.sheet_names():
+                write_markdown(output, name, iter(book.sheet_by_name(name).to_array()))
+        return self.read_outputs(output)
+
+    @staticmethod
+    def create_book() -> openpyxl.Workbook:
+        book = openpyxl.Workbook()
+        sheet = book.create_sheet("Visible", 0)
+        book.remove(book.worksheets[1])
+        for row in range(1, 8):
+            sheet.append([f"{column}{row}" for column in "ABCDEF"])
+        sheet.cell(10, 2, "B10")
+        return book
+
+    def test_generated(self):
+        Faker.seed(0)
+        data = XLSXGenerator().to_bytes()
+        self.source.write_bytes(data)
+        xlsx_processor(self.source, self.output)
+        self.assertEqual(self.read_outputs(self.output), self.pyexcel_outputs(data))
+
+    def test_hidden(self):
+        book = self.create_book()
+        book["Visible"].row_dimensions[3].hidden = True
+        book["Visible"].column_dimensions["B"].hidden = True
+        book.create_sheet("Hidden").append(["hidden"])
+        book["Hidden"].sheet_state = "hidden"
+        data = workbook_bytes(book)
+        self.source.write_bytes(data)
+
+        # Hidden rows, columns and sheets are skipped, as by pyexcel
+        xlsx_processor(self.source, self.output)
+        outputs = self.read_outputs(self.output)
+        self.assertEqual(list(outputs), ["Visible.txt"])
+        self.assertNotIn("A3", outputs["Visible.txt"])
+        self.assertNotIn("B1", outputs["Visible.txt"])
+        self.assertIn("F7", outputs["Visible.txt"])
+        self.assertEqual(outputs, self.pyexcel_outputs(data))
+
+    def test_styled_empty(self):
+        # Cells styled but empty do not widen (or lengthen) the table
+        book = self.create_book()
+        book["Visible"]["H2"].font = Font(bold=True)
+        book["Visible"]["C12"].font = Font(bold=True)
+        book["Visible"]["G3"] = ""
+        data = workbook_bytes(book)
+        self.source.write_bytes(data)
+
+        xlsx_processor(self.source, self.output)
+        outputs = self.read_outputs(self.output)
+        self.assertIn("| A1 | B1 | C1 | D1 | E1 | F1 |  \n", outputs["Visible.txt"])
+        self.assertEqual(outputs, self.pyexcel_outputs(data))
+
+    def test_merged(self):
+        # The value of merged cells is copied across their range, as by pyexcel
+        book = self.create_book()
+        book["Visible"].merge_cells("A2:B3")
+        book["Visible"].merge_cells("F5:H6")
+        book["Visible"].merge_cells("C8:D9")
+        data = workbook_bytes(book)
+        self.source.write_bytes(data)
+
+        xlsx_processor(self.source, self.output)
+        outputs = self.read_outputs(self.output)
+        self.assertIn("| A2 | A2 | C2 |", outputs["Visible.txt"])
+        self.assertIn("| A2 | A2 | C3 |", outputs["Visible.txt"])
+        self.assertIn("| E6 | F5 | F5 | F5 |  \n", outputs["Visible.txt"])
+        self.assertEqual(outputs, self.pyexcel_outputs(data))
+
+    def test_openpyxl_version(self):
+        self.source.write_bytes(workbook_bytes(self.create_book()))
+        with mock.patch.object(openpyxl, "__version__", "4.0.0"):
+            with self.assertRaisesRegex(RuntimeError, "not supported with openpyxl"):
+                xlsx_processor(self.source, self.output)
+
+    def test_hidden_range(self):
+        # Each of a range of columns is hidden (pyexcel only hides the first)
+        book = self.create_book()
+        book["Visible"].column_dimensions.group("C", "E", hidden=True)
+        self.source.write_bytes(workbook_bytes(book))
+
+        xlsx_processor(self.source, self.output)
+        text = self.read_outputs(self.output)["Visible.txt"]
+        self.assertIn("| A1 | B1 | F1 |", text)
+        self.assertIn("| A7 | B7 | F7 |", text)
+        self.assertIn("|  | B10 |  |", text)
+
+
+class TestWriteMarkdown(unittest.TestCase):
+    """Writes sheets as chunks of Markdown to the in-memory backend"""
+
+    def setUp(self):
+        GCSPath.use_client(MemoryClient())
+        self.addCleanup(GCSPath.use_client, None)
+        self.output = GCSPath("gs://memory/book.xlsx.out")
+
+    def read_outputs(self) -> dict:
+        prefix = self.output.path + "/"
+        return {
+            path.path[len(prefix) :]: path.read_text()
+            for path in GCSPath(str(self.output) + "/").list()
+        }
+
+    @staticmethod
+    def table_rows(text: str) -> list[str]:
+        """Get the rows of the table in an output (less its header)"""
+        return text.split("|:---|:---|  \n")[1].strip().split("  \n")
+
+    def test_single(self):
+        rows = [["a", "b"], ["1", "2"]]
+        self.assertEqual(write_markdown(self.output, "Data", iter(rows)), 1)
+        self.assertEqual(
+            self.read_outputs(),
+            {
+                "Data.txt": "# Data  \n  \n| a | b |  \n|:---|:---|  \n"
+                "| 1 | 2 |  \n  \n"
+            },
+        )
+
+    def test_chunks(self):
+        rows = [["a", "b"]] + [[f"{i}", "x" * 50] for i in range(100)]
+        count = write_markdown(self.output, "Data", iter(rows), max_bytes=1000)
+
+        # Chunks cannot collide with other sheets, as Data-2 would
+        write_markdown(self.output, "Data-2", iter(rows[:2]))
+        outputs = self.read_outputs()
+        self.assertGreater(count, 1)
+        self.assertEqual(
+            sorted(outputs),
+            sorted([f"Data[{i}].txt" for i in range(1, count + 1)] + ["Data-2.txt"]),
+        )
+
+        # Each chunk is within the size, titled with its rows
+        data_rows = []
+        for i in range(1, count + 1):
+            text = outputs[f"Data[{i}].txt"]
+            self.assertLessEqual(len(text.encode()), 1000)
+            chunk_rows = self.table_rows(text)
+            first = len(data_rows) + 1
+            last = len(data_rows) + len(chunk_rows)
+            self.assertTrue(text.startswith(f"# Data (rows {first}-{last})"))
+            data_rows += chunk_rows
+        self.assertEqual(data_rows, [f"| {i} | {'x' * 50} |" for i in range(100)])
+
+    def test_oversized_row(self):
+        cell = "".join(f"é{i}" for i in range(1000))
+        rows = [["a", "b"], ["1", "2"], ["3", cell], ["4", "5"]]
+        count = write_markdown(self.output, "Data", iter(rows), max_bytes=1000)
+        outputs = self.read_outputs()
+        texts = [outputs[f"Data[{i}].txt"] for i in range(1, count + 1)]
+
+        # The row is split over chunks of its own, the last with the next row
+        self.assertTrue(all(len(text.encode()) <= 1000 for text in texts))
+        self.assertTrue(texts[0].startswith("# Data (rows 1-1)"))
+        self.assertTrue(texts[1].startswith("# Data (rows 2-2)"))
+        self.assertTrue(texts[-1].startswith("# Data (rows 2-3)"))
+        pieces = [self.table_rows(text)[0] for text in texts[1:]]
+        self.assertEqual("".join(pieces), f"| 3 | {cell} |")
+        self.assertEqual(self.table_rows(texts[-1])[-1], "| 4 | 5 |")
+
+    def test_wide_header(self):
+        header = [f"column {i:04}" for i in range(100)]
+        rows = [header] + [[f"row {i} {j:04}" for j in range(100)] for i in range(5)]
+        with self.assertLogs("processors.xlsx.xlsx_processor", "WARNING"):
+            count = write_markdown(self.output, "Data", iter(rows), max_bytes=1000)
+        outputs = self.read_outputs()
+
+        # Chunks exceed the size, each holding at least a row
+        separator = "|" + ":---|" * len(header) + "  \n"
+        data_rows = []
+        for i in range(1, count + 1):
+            text = outputs[f"Data[{i}].txt"]
+            chunk_rows = text.split(separator)[1].strip().split("  \n")
+            self.assertEqual(len(chunk_rows), 1)
+            data_rows += chunk_rows
+        self.assertEqual(data_rows, [markdown_row(row).strip() for row in rows[1:]])
+
+    def test_split_line(self):
+        line = "aé€😀" * 10
+        for max_bytes in range(1, 12):
+            with self.subTest(max_bytes=max_bytes):
+                pieces = split_line(line, max_bytes)
+                self.assertEqual("".join(pieces), line)
+                self.assertTrue(
+                    all(len(piece.encode()) <= max(max_bytes, 4) for piece in pieces)
+                )
+
+
+class TestMarkdownRows(unittest.TestCase):
+    """Formats batches of rows as one cell at a time"""
+
+    def assertFormatted(self, rows: list[list]):
+        self.assertEqual(
+            markdown_rows(rows),
+            [markdown_row([cleanse_string(v) for v in row]) for row in rows],
+        )
+
+    def test_values(self):
+        self.assertFormatted(
+            [
+                ["text", 1, 2.5, None, True],
+                [" padded ", "", 0, datetime.date(2024, 1, 2), "a|b"],
+                ["<tag> & 'quotes'", '"', "|", "||x", "trailing\\"],
+            ]
+        )
+
+    def test_multiline(self):
+        self.assertFormatted(
+            [
+                ["one\ntwo", "plain", "a\n\nb"],
+                ["plain", " \nleading", "trailing\n "],
+                ["<a>\n|b|", "\n", "x"],
+            ]
+        )
+        self.assertFormatted([["a\nb"]])
+
+    def test_separators(self):
+        # Cells containing the batch separators, one cell at a time
+        self.assertFormatted([["a\x00b", "c"], ["d\x01", "e\x02\nf"]])
+
+    def test_ragged(self):
+        self.assertFormatted([["a", "b"], ["c"], []])
+        self.assertFormatted([[], []])
+        self.assertEqual(markdown_rows([]), [])
+
+    def test_generated(self):
+        Faker.seed(0)
+        sheet = XLSXGenerator().get_sheet(min_rows=200, max_rows=200)
+        self.assertFormatted(sheet)
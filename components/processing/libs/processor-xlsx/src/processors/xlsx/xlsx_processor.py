@@ -13,17 +13,46 @@
 # limitations under the License.
 
 
+import dataclasses
+import itertools
 import logging
-from typing import Dict
+import os
+import string
+from html import escape
+from os import linesep
+from typing import Dict, Iterator
+from xml.parsers import expat
 
+import openpyxl
 import pyexcel
-from markdowngenerator import MarkdownGenerator
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.xml.constants import SHEET_MAIN_NS
 from processors.base.gcsio import GCSPath
+from pyexcel.sheet import make_names_unique
 
 # mypy: disable-error-code="import-untyped"
 
 logger = logging.getLogger(__name__)
 
+# Formats that are read as zip archives, so can be read from a stream
+STREAMED_FILE_TYPES = {"xlsx", "xlsm"}
+
+# Size of the outputs (within the Data Store limit for text), larger sheets
+# are split into chunks of rows
+XLSX_MAX_CHUNK_BYTES = int(
+    os.environ.get("XLSX_MAX_CHUNK_BYTES", str(int(2.5 * 1024 * 1024)))
+)
+
+# Rows cleansed and formatted together as a batch
+XLSX_BATCH_ROWS = 1000
+
+# Separators of the cells and rows (and the end of multi-line cells) within
+# a batch, control characters that are not valid in xlsx cells
+CELL_SEP = "\x00"
+ROW_SEP = "\x01"
+BREAK_SEP = "\x02"
+
 
 def cleanse_string(c):
     c = str(c)
@@ -34,41 +63,352 @@ def cleanse_string(c):
     return c
 
 
-def xlsx_processor(source: GCSPath, output_dir: GCSPath) -> Dict:
+def markdown_line(text: str = "") -> str:
+    """Format a line of Markdown, as MarkdownGenerator.writeTextLine"""
+    return escape(text) + "  " + linesep
 
-    # Load the book
-    logging.info(f"Extracting spreadsheet {str(source)}")
-    with source.read_as_file() as r:
-        book = pyexcel.get_book(
-            file_name=r,
-            force_file_type=source.suffix[1:],
+
+def markdown_row(row: list) -> str:
+    """Format a row of a Markdown table, as MarkdownGenerator.addTable"""
+    cells = []
+    for element in row:
+        if isinstance(element, list):
+            cells.append("| " + "".join(escape(s) + "<br> " for s in element))
+        else:
+            cells.append(escape(f"| {element} "))
+    return "".join(cells) + markdown_line("|")
+
+
+def markdown_rows(rows: list[list]) -> list[str]:
+    """Cleanse and format rows of a Markdown table, as markdown_row
+
+    The cells are cleansed a column at a time, then joined and escaped in a
+    few passes over the batch, rather than one cell at a time.
+    """
+    width = len(rows[0]) if rows else 0
+    columns = []
+    if width and all(len(row) == width for row in rows):
+        for column in zip(*rows):
+            cells = list(map(str.strip, map(str, column)))
+            joined = "".join(cells)
+            if CELL_SEP in joined or ROW_SEP in joined or BREAK_SEP in joined:
+                break
+
+            # Multi-line cells end with a break (rather than a space)
+            if "\n" in joined:
+                cells = [cell + BREAK_SEP if "\n" in cell else cell for cell in cells]
+            columns.append(cells)
+
+    if not width or len(columns) != width:
+        # Ragged rows, or cells containing separators, one cell at a time
+        return [markdown_row([cleanse_string(v) for v in row]) for row in rows]
+
+    text = "".join(CELL_SEP.join(row) + ROW_SEP for row in zip(*columns))
+    text = escape(text.replace("|", "\\|")).replace("\n", "<br> ")
+    if BREAK_SEP in text:
+        text = text.replace(BREAK_SEP + CELL_SEP, "<br> | ")
+        text = text.replace(BREAK_SEP + ROW_SEP, "<br> |  " + linesep + "| ")
+    text = text.replace(CELL_SEP, " | ").replace(ROW_SEP, " |  " + linesep + "| ")
+    return [line + linesep for line in ("| " + text).split(linesep)[:-1]]
+
+
+def split_line(line: str, max_bytes: int) -> list[str]:
+    """Split a line into pieces of up to max_bytes (encoded) each"""
+    data = line.encode()
+    max_bytes = max(max_bytes, 4)
+    pieces = []
+    start = 0
+    while start < len(data):
+        # Split between characters, before any UTF-8 continuation bytes
+        end = min(start + max_bytes, len(data))
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        pieces.append(data[start:end].decode())
+        start = end
+    return pieces
+
+
+def write_markdown(
+    output_dir: GCSPath,
+    name: str,
+    rows: Iterator[list],
+    max_bytes: int = XLSX_MAX_CHUNK_BYTES,
+) -> int:
+    """Write a sheet as Markdown tables of up to max_bytes, returning the count
+
+    The first row is the header (named as pyexcel does), repeated in each
+    table. The output is as MarkdownGenerator's addHeader and (left aligned)
+    addTable. A sheet that fits is written as {name}.txt, otherwise as
+    {name}[1].txt, {name}[2].txt, ... titled with their (data) rows ([ and ]
+    are not valid in sheet names, so chunks cannot collide with other sheets).
+    A row that does not fit by itself is split over chunks of its own.
+    """
+    header = make_names_unique(next(rows, []))
+    table_header = (
+        markdown_line()
+        + "".join(escape(f"| {column} ") for column in header)
+        + markdown_line("|")
+        + markdown_line("|" + ":---|" * len(header))
+    )
+
+    # The budget for the rows, leaving room for the longest title
+    longest_title = markdown_line(f"# {name} (rows {10**12}-{10**12})")
+    budget = max_bytes - len((longest_title + table_header + markdown_line()).encode())
+
+    # A header too wide for the chunks leaves room for at least a row as wide
+    minimum = len(table_header.encode())
+    if budget < minimum:
+        logger.warning(
+            "Header of sheet %s is too wide for chunks of %d bytes, exceeding them",
+            name,
+            max_bytes,
         )
+        budget = minimum
+
+    chunks = 0
+    lines: list[str] = []
+    size = 0
+    first = 1
+
+    def write_chunk(last: int, final: bool):
+        nonlocal chunks, lines, size, first
+        chunks += 1
+        if final and chunks == 1:
+            output, title = GCSPath(output_dir, name + ".txt"), name
+        else:
+            output = GCSPath(output_dir, f"{name}[{chunks}].txt")
+            title = f"{name} (rows {first}-{last})"
+        output.write_text(
+            markdown_line(f"# {title}")
+            + table_header
+            + "".join(lines)
+            + markdown_line()
+        )
+        lines, size, first = [], 0, last + 1
+
+    count = 0
+    for batch in iter(lambda: list(itertools.islice(rows, XLSX_BATCH_ROWS)), []):
+        for line in markdown_rows(batch):
+            line_size = len(line.encode())
+            if lines and size + line_size > budget:
+                write_chunk(count, final=False)
+            count += 1
+            if line_size > budget:
+                # All but the last piece of the row are chunks of their own
+                *pieces, line = split_line(line, budget)
+                for piece in pieces:
+                    lines = [piece]
+                    write_chunk(count, final=False)
+                    first = count
+                line_size = len(line.encode())
+            lines.append(line)
+            size += line_size
+
+    write_chunk(count, final=True)
+    if chunks > 1:
+        logger.info("Split sheet %s into %d chunks", name, chunks)
+    return chunks
+
+
+# The openpyxl versions whose worksheet internals are read for the layout
+OPENPYXL_LAYOUT_VERSIONS = ("3.0.", "3.1.")
+
+# Elements of the worksheet XML, as named by expat (namespace, name)
+SHEET_TAGS = {
+    name: f"{SHEET_MAIN_NS} {name}"
+    for name in ("row", "c", "v", "t", "col", "mergeCell")
+}
 
-        for name in book.sheet_names():
-            sheet = book.sheet_by_name(name)
 
-            # Assume the first row is the header for the data
-            sheet.name_columns_by_row(0)
+@dataclasses.dataclass
+class SheetLayout:
+    """Layout of a worksheet, read before streaming its rows"""
 
-            # Markdown output
-            with (
-                GCSPath(output_dir, name + ".txt").write_as_file() as f,
-                MarkdownGenerator(filename=f) as m,
+    max_row: int = 0
+    # The last column with a value in a visible row (and column)
+    max_column: int = 0
+    hidden_rows: set[int] = dataclasses.field(default_factory=set)
+    hidden_columns: set[int] = dataclasses.field(default_factory=set)
+    # Bounds of the merged cells (min_col, min_row, max_col, max_row)
+    merged: list[tuple[int, int, int, int]] = dataclasses.field(default_factory=list)
+
+
+def is_hidden(attrs: dict) -> bool:
+    """Return if a row or column (attributes) is hidden"""
+    return attrs.get("hidden") in ("1", "true")
+
+
+def read_sheet_layout(sheet) -> SheetLayout:
+    """Read the layout of a read-only worksheet from its XML
+
+    Read-only worksheets do not load the row and column dimensions or merged
+    cells, so the sheet is parsed here for them and the extent of its values,
+    reading its source and shared strings as openpyxl does. It is parsed with
+    expat, handling only the elements needed, as the values are then read in
+    a second pass.
+    """
+    if not openpyxl.__version__.startswith(OPENPYXL_LAYOUT_VERSIONS):
+        raise RuntimeError(
+            f"Streaming xlsx sheets is not supported with openpyxl "
+            f"{openpyxl.__version__}, only {', '.join(OPENPYXL_LAYOUT_VERSIONS)}"
+        )
+
+    layout = SheetLayout()
+    # pylint: disable=protected-access
+    shared_strings = sheet._shared_strings
+    row = column = 0
+    row_hidden = False
+    # The element whose text is the value of a cell that may widen the sheet
+    value_tag = ""
+    shared = False
+    text: list[str] = []
+
+    def start(tag: str, attrs: dict):
+        nonlocal row, column, row_hidden, value_tag, shared
+        if tag == SHEET_TAGS["c"]:
+            # Numbered as by openpyxl, when cells (or rows) are missing it
+            ref = attrs.get("r")
+            column = (
+                column_index_from_string(ref.rstrip(string.digits))
+                if ref
+                else column + 1
+            )
+            layout.max_row = row
+            value_tag = ""
+            if (
+                column > layout.max_column
+                and not row_hidden
+                and column not in layout.hidden_columns
             ):
-                m.addHeader(1, name)
-
-                # Prepare data
-                data = []
-                first_row = True
-                for row in sheet.to_array():
-                    if first_row:
-                        first_row = False
-                        continue
-                    data.append([cleanse_string(v) for v in row])
+                cell_type = attrs.get("t", "n")
+                value_tag = SHEET_TAGS["t" if cell_type == "inlineStr" else "v"]
+                shared = cell_type == "s"
+        elif tag == value_tag:
+            text.clear()
+            parser.CharacterDataHandler = text.append
+        elif tag == SHEET_TAGS["row"]:
+            row = int(float(attrs["r"])) if "r" in attrs else row + 1
+            column = 0
+            row_hidden = is_hidden(attrs)
+            if row_hidden:
+                layout.hidden_rows.add(row)
+        elif tag == SHEET_TAGS["col"]:
+            if is_hidden(attrs):
+                first = int(attrs["min"])
+                last = int(attrs.get("max", first))
+                layout.hidden_columns.update(range(first, last + 1))
+        elif tag == SHEET_TAGS["mergeCell"]:
+            layout.merged.append(CellRange(attrs["ref"]).bounds)
+
+    def end(tag: str):
+        nonlocal value_tag
+        if tag == value_tag:
+            parser.CharacterDataHandler = None
+            value = "".join(text)
+            if value and (not shared or shared_strings[int(value)] != ""):
+                layout.max_column = column
+                value_tag = ""
+        elif tag == SHEET_TAGS["c"]:
+            value_tag = ""
+
+    parser = expat.ParserCreate(namespace_separator=" ")
+    parser.buffer_text = True
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    with sheet._get_source() as source:
+        parser.ParseFile(source)
+    return layout
+
+
+def iter_sheet_rows(sheet) -> Iterator[list]:
+    """Iterate the rows of a read-only worksheet, as pyexcel reads them
+
+    Empty cells are empty strings, and rows are padded to the last visible
+    column with a value (as pyexcel trims and pads them). Hidden rows and
+    columns are skipped, and the value of each merged cell is copied across
+    its range. The layout is read first, then the values streamed.
+    """
+    layout = read_sheet_layout(sheet)
+    merged = sorted(layout.merged, key=lambda bounds: bounds[1])
+    max_row = max([layout.max_row] + [bounds[3] for bounds in merged])
+
+    def is_visible(column: int, row: int) -> bool:
+        return column not in layout.hidden_columns and row not in layout.hidden_rows
 
-                # Generate the table
-                m.addTable(
-                    header_names=sheet.colnames, alignment="left", row_elements=data
+    # Merged cells with a value (as filled) beyond the values widen the sheet
+    width = layout.max_column
+    for min_col, min_row, max_col, _ in merged:
+        if max_col > width and is_visible(min_col, min_row):
+            first = [
+                row[0]
+                for row in sheet.iter_rows(
+                    min_row=min_row,
+                    max_row=min_row,
+                    min_col=min_col,
+                    max_col=min_col,
+                    values_only=True,
                 )
+            ]
+            if first and first[0]:
+                width = max_col
+    columns = [c for c in range(1, width + 1) if c not in layout.hidden_columns]
+
+    empty = (None,) * width
+    rows = iter(())
+    if width:
+        rows = sheet.iter_rows(max_row=max_row, max_col=width, values_only=True)
+    starting = 0
+    filling: list[tuple[tuple[int, int, int, int], object]] = []
+    for index in range(1, max_row + 1):
+        values: list = list(next(rows, empty))
+
+        # Merged cells take the value of their first cell, if visible and set
+        while starting < len(merged) and merged[starting][1] == index:
+            bounds = merged[starting]
+            starting += 1
+            fill = None
+            if bounds[0] <= width and is_visible(bounds[0], index):
+                fill = values[bounds[0] - 1] or None
+            filling.append((bounds, fill))
+        filling = [(bounds, fill) for bounds, fill in filling if bounds[3] >= index]
+        for (min_col, min_row, max_col, _), fill in filling:
+            for c in range(min_col, min(max_col, width) + 1):
+                if (c, index) != (min_col, min_row):
+                    values[c - 1] = fill
+
+        if index not in layout.hidden_rows:
+            yield ["" if values[c - 1] is None else values[c - 1] for c in columns]
+
+    # Finish reading the rows, closing the source
+    for _ in rows:
+        pass
+
+
+def xlsx_processor(source: GCSPath, output_dir: GCSPath) -> Dict:
+
+    # Load the book
+    logging.info(f"Extracting spreadsheet {str(source)}")
+    file_type = source.suffix[1:].lower()
+    if file_type in STREAMED_FILE_TYPES:
+        reader = source.read_as_stream()
+    else:
+        reader = source.read_as_file()
+
+    with reader as r:
+        if file_type in STREAMED_FILE_TYPES:
+            # Rows are streamed from the sheets, rather than loading the book
+            book = openpyxl.load_workbook(r, read_only=True, data_only=True)
+            try:
+                for sheet in book.worksheets:
+                    if sheet.sheet_state == "hidden":
+                        continue
+                    write_markdown(output_dir, sheet.title, iter_sheet_rows(sheet))
+            finally:
+                book.close()
+            return dict()
+
+        book = pyexcel.get_book(file_name=r, force_file_type=source.suffix[1:])
+        for name in book.sheet_names():
+            write_markdown(output_dir, name, iter(book.sheet_by_name(name).to_array()))
 
     return dict()